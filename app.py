@@ -2,14 +2,15 @@ from __future__ import annotations
 
 from pathlib import Path
 import sqlite3
-from typing import List, Optional
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Set
 from datetime import date
+import os
 
-from fastapi import FastAPI, Request, Form, HTTPException, UploadFile, File
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import APIRouter, FastAPI, Request, Form, HTTPException, UploadFile, File
+from fastapi.responses import HTMLResponse, PlainTextResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-import uvicorn
 import json
 
 APP_DIR = Path(__file__).resolve().parent
@@ -778,8 +779,6 @@ def _rebuild_championship_seasons_nullable_team(conn: sqlite3.Connection) -> Non
     conn.commit()
 
 # === Highlights dry-run compute (World + Tag only) ===========================
-from collections import defaultdict
-from typing import Dict, List, Set
 
 # Round names (exact per your DB; case-insensitive compare)
 ROUND_QF = "Quarter Final"
@@ -999,7 +998,6 @@ def dry_run_all_except_us(conn: sqlite3.Connection, season: int | None = None) -
     """Compute highlights for World (Men/Women), Tag, NXT (M/W), Underground (M/W),
     Hardcore (M/W), and one-off tournaments (Rumble/Chamber/Battle Royals/Gauntlets).
     Does not persist; returns {wrestler_id: [labels...]}."""
-    from collections import defaultdict
 
     # Seasons to process
     if season is None:
@@ -1287,6 +1285,9 @@ def init_db() -> None:
         conn.execute("CREATE INDEX IF NOT EXISTS idx_wrestlers_name          ON wrestlers(name)")
         conn.execute("CREATE INDEX IF NOT EXISTS idx_wrestlers_active        ON wrestlers(active)")
         conn.execute("CREATE INDEX IF NOT EXISTS idx_tag_teams_name          ON tag_teams(name)")
+        # NOCASE twins serve the `name = ? COLLATE NOCASE` lookups used by the forms and importers
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_wrestlers_name_nocase   ON wrestlers(name COLLATE NOCASE)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_tag_teams_name_nocase   ON tag_teams(name COLLATE NOCASE)")
         conn.execute("CREATE INDEX IF NOT EXISTS idx_tag_teams_active        ON tag_teams(active)")
         conn.execute("CREATE INDEX IF NOT EXISTS idx_team_members_team       ON tag_team_members(team_id)")
         conn.execute("CREATE INDEX IF NOT EXISTS idx_team_members_wrestler   ON tag_team_members(wrestler_id)")
@@ -1352,7 +1353,6 @@ async def favicon_redirect():
 
 @app.get("/", response_class=HTMLResponse, include_in_schema=False)
 async def home(request: Request):
-    import os, json
     conn = get_conn()
     try:
         # Pull all championships
@@ -3110,12 +3110,6 @@ def _refresh_wrestler_cache() -> None:
 # === REPLACE your previous matches block in app.py with this entire block ===
 # Supports: full participant model (any number of sides), Day ordering, MM:SS time, draw/NC.
 
-from typing import Optional, List, Dict, Tuple
-import os
-import sqlite3
-from fastapi import APIRouter, Request
-from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
 
 router = APIRouter()
 TEMPLATES = Jinja2Templates(directory="templates")
@@ -3183,7 +3177,9 @@ def ensure_matches_schema(conn: sqlite3.Connection) -> None:
     conn.execute("CREATE INDEX IF NOT EXISTS idx_matches_season     ON matches(season);")
     conn.execute("CREATE INDEX IF NOT EXISTS idx_matches_tournament ON matches(tournament);")
     conn.execute("CREATE INDEX IF NOT EXISTS idx_matches_day        ON matches(day_index);")
-    conn.execute("CREATE INDEX IF NOT EXISTS idx_mp_match           ON match_participants(match_id);")
+    # match_id / (match_id, side) lookups use the UNIQUE(match_id, side, wrestler_id) autoindex,
+    # which also covers them; a separate match_id index only adds write cost
+    conn.execute("DROP INDEX IF EXISTS idx_mp_match;")
     conn.execute("CREATE INDEX IF NOT EXISTS idx_mp_wrestler        ON match_participants(wrestler_id);")
 
     # NOTE: v2 does NOT create match_wrestlers_view (we read from match_participants directly)
@@ -3338,6 +3334,8 @@ def _ensure_highlight_runs_season_col(conn: sqlite3.Connection) -> None:
     if "season" not in cols:
         conn.execute("ALTER TABLE highlight_runs ADD COLUMN season INTEGER")
         conn.commit()
+    # Latest watermark per season is an index seek rather than a table scan
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_hr_season_id ON highlight_runs(season, id DESC)")
 
 
 def _record_highlight_run(conn: sqlite3.Connection, season: int) -> None:
@@ -3380,8 +3378,38 @@ def _label_id(conn: sqlite3.Connection, label: str) -> int:
     return int(row["id"]) if row else -1
 
 
+def _label_ids(conn: sqlite3.Connection, labels: Iterable[str]) -> dict[str, int]:
+    """Map each label to its highlight_types id with one SELECT; missing labels go through _label_id."""
+    ids = {r["label"]: int(r["id"]) for r in conn.execute("SELECT id, label FROM highlight_types ORDER BY id DESC")}
+    for label in set(labels) - ids.keys():
+        ids[label] = _label_id(conn, label)
+    return ids
+
+
+def _rewrite_wrestler_highlights(conn: sqlite3.Connection, season: int, results: dict[int, list[str]]) -> int:
+    """Replace the season's wrestler_highlights slice with `results`.
+    Takes the write lock up front with BEGIN IMMEDIATE and leaves the transaction open, so the
+    caller commits it together with the team highlights / watermark it writes afterwards."""
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+    label_ids = _label_ids(conn, (label for labels in results.values() for label in labels))
+    rows: list[tuple[int, int]] = []
+    for wid, labels in results.items():
+        for label in labels:
+            hid = label_ids[label]
+            if hid != -1:
+                rows.append((int(wid), hid))
+
+    conn.execute("DELETE FROM wrestler_highlights WHERE season = ?", (season,))
+    # season is fixed for the whole batch: inline it (int() keeps it a safe literal)
+    conn.executemany(
+        f"INSERT OR IGNORE INTO wrestler_highlights(wrestler_id, highlight_id, season) VALUES (?, ?, {int(season)})",
+        rows,
+    )
+    return len(rows)
+
+
 # === Team highlights (Tag Team World: SF/Runner-up/Champion) ================
-from typing import Set
 
 
 def _side_to_team_id(conn: sqlite3.Connection, wrestler_ids: Set[int]) -> int | None:
@@ -3476,7 +3504,6 @@ def recompute_team_tag_highlights(conn: sqlite3.Connection, season: int) -> int:
 
 # Paste these NEW helpers directly UNDER `_load_team_pairs(...)` in app.py
 
-from typing import Tuple  # at top of file you already import List, Dict, Optional
 
 
 def _team_pairs_full(conn: sqlite3.Connection) -> Dict[frozenset, Dict[str, int | str]]:
@@ -3920,7 +3947,6 @@ app.include_router(router)
 
 
 
-from fastapi.responses import PlainTextResponse
 
 @app.get("/admin/init-highlights", response_class=PlainTextResponse)
 def admin_init_highlights():
@@ -3935,7 +3961,6 @@ def admin_init_highlights():
 
 
 
-from fastapi.responses import PlainTextResponse
 
 @app.get("/admin/seed-highlights", response_class=PlainTextResponse)
 def admin_seed_highlights():
@@ -3948,8 +3973,6 @@ def admin_seed_highlights():
     finally:
         conn.close()
 
-from fastapi import Request
-from fastapi.responses import HTMLResponse
 
 
 @app.get("/admin/highlight-types", response_class=HTMLResponse)
@@ -3968,18 +3991,10 @@ def admin_highlight_types(request: Request):
     finally:
         conn.close()
 
-from fastapi import Request
-from fastapi.responses import HTMLResponse
 
 
-from collections import Counter
-from fastapi import Request
-from fastapi.responses import HTMLResponse
 
 
-from collections import Counter
-from fastapi import Request
-from fastapi.responses import HTMLResponse
 
 
 @app.get("/admin/highlights/dry-run", response_class=HTMLResponse)
@@ -4034,18 +4049,6 @@ def admin_highlights_dry_run(request: Request, season: int | None = None):
 
 
 
-from fastapi import Request, Form
-from fastapi.responses import RedirectResponse
-
-
-def _label_to_type_id(conn: sqlite3.Connection, label: str) -> int:
-    row = conn.execute("SELECT id FROM highlight_types WHERE label = ?", (label,)).fetchone()
-    if row:
-        return int(row["id"])
-    # Auto-register if missing (defensive; should be seeded already)
-    code = label.lower().replace(" ", "_")
-    conn.execute("INSERT OR IGNORE INTO highlight_types(code, label) VALUES (?, ?)", (code, label))
-    return int(conn.execute("SELECT id FROM highlight_types WHERE label = ?", (label,)).fetchone()["id"])
 
 
 @app.post("/admin/highlights/persist-world-tag")
@@ -4055,29 +4058,16 @@ def admin_highlights_persist_world_tag(season: int = Form(...)):
         ensure_highlights_schema(conn)
         # Compute for exactly one season
         results = dry_run_world_tag(conn, season=season)
-        # Clear slice for idempotency
-        conn.execute("DELETE FROM wrestler_highlights WHERE season = ?", (season,))
-        inserted = 0
-        for wid, labels in results.items():
-            for label in labels:
-                hid = _label_to_type_id(conn, label)
-                conn.execute(
-                    "INSERT OR IGNORE INTO wrestler_highlights(wrestler_id, highlight_id, season) VALUES (?, ?, ?)",
-                    (int(wid), int(hid), int(season)),
-                )
-                inserted += 1
+        # Replace slice for idempotency
+        inserted = _rewrite_wrestler_highlights(conn, int(season), results)
         conn.commit()
     finally:
         conn.close()
     # Redirect back to dry-run with a success note
     return RedirectResponse(url=f"/admin/highlights/dry-run?season={season}&persisted=1&added={inserted}", status_code=303)
 
-from fastapi import Form
-from fastapi.responses import RedirectResponse
 
 
-from fastapi import Form
-from fastapi.responses import RedirectResponse
 
 # In: /admin/highlights/persist-all-except-us
 # After computing and before/around commit, call the watermark helper.
@@ -4088,26 +4078,8 @@ def admin_highlights_persist_all_except_us(season: int = Form(...)):
     try:
         ensure_highlights_schema(conn)
         results = dry_run_all_except_us(conn, season=season)
-        # Clear slice for idempotency
-        conn.execute("DELETE FROM wrestler_highlights WHERE season = ?", (season,))
-        inserted = 0
-        for wid, labels in results.items():
-            for label in labels:
-                row = conn.execute("SELECT id FROM highlight_types WHERE label = ?", (label,)).fetchone()
-                if row is None:
-                    code = label.lower().replace(" ", "_")
-                    conn.execute(
-                        "INSERT OR IGNORE INTO highlight_types(code, label) VALUES (?, ?)",
-                        (code, label),
-                    )
-                    row = conn.execute("SELECT id FROM highlight_types WHERE label = ?", (label,)).fetchone()
-                hid = int(row["id"]) if row else None
-                if hid is not None:
-                    conn.execute(
-                        "INSERT OR IGNORE INTO wrestler_highlights(wrestler_id, highlight_id, season) VALUES (?, ?, ?)",
-                        (int(wid), hid, int(season)),
-                    )
-                    inserted += 1
+        # Replace slice for idempotency
+        inserted = _rewrite_wrestler_highlights(conn, int(season), results)
         # Record watermark for this season (last day/order/id seen in matches)
         _record_highlight_run(conn, int(season))
         conn.commit()
@@ -4122,8 +4094,6 @@ def admin_highlights_persist_all_except_us(season: int = Form(...)):
 
 
 
-from fastapi import Request
-from fastapi.responses import HTMLResponse
 
 
 @app.get("/admin/highlights/status", response_class=HTMLResponse)
@@ -4161,8 +4131,6 @@ def admin_highlights_status(request: Request):
     finally:
         conn.close()
 
-from fastapi import Form
-from fastapi.responses import RedirectResponse
 
 
 # Replace the two persist endpoints so they also populate team_highlights
@@ -4174,17 +4142,7 @@ def admin_highlights_persist_all(season: int = Form(...)):
         ensure_highlights_schema(conn)
         # Wrestlers (all families incl. US)
         results = dry_run_all(conn, season=season)
-        conn.execute("DELETE FROM wrestler_highlights WHERE season = ?", (season,))
-        inserted = 0
-        for wid, labels in results.items():
-            for label in labels:
-                hid = _label_id(conn, label)
-                if hid != -1:
-                    conn.execute(
-                        "INSERT OR IGNORE INTO wrestler_highlights(wrestler_id, highlight_id, season) VALUES (?, ?, ?)",
-                        (int(wid), hid, int(season)),
-                    )
-                    inserted += 1
+        inserted = _rewrite_wrestler_highlights(conn, int(season), results)
         # Teams (Tag Team World — champions)
         t_inserted = recompute_team_tag_highlights(conn, int(season))
         _record_highlight_run(conn, int(season))
@@ -4207,31 +4165,19 @@ def admin_highlights_persist_incremental(season: int = Form(...)):
             "SELECT last_day, last_order, last_match_id FROM highlight_runs WHERE season = ? ORDER BY id DESC LIMIT 1",
             (season,),
         ).fetchone()
-        cur = conn.execute(
-            """
-            SELECT COALESCE(MAX(day_index), -1) AS d,
-                   COALESCE(MAX(order_in_day), -1) AS o,
-                   MAX(id) AS mid
-            FROM matches WHERE season = ?
-            """,
-            (season,),
-        ).fetchone()
-        if wm and int(wm["last_day"]) == int(cur["d"]) and int(wm["last_order"]) == int(cur["o"]) and int(wm["last_match_id"] or -1) == int(cur["mid"] or -1):
-            return RedirectResponse(url=f"/admin/highlights/dry-run?season={season}&unchanged=1", status_code=303)
+        # Nothing to do unless a match was added past the watermark (index probe on
+        # idx_matches_season, which already carries the rowid as its trailing key)
+        if wm:
+            newer = conn.execute(
+                "SELECT 1 FROM matches WHERE season = ? AND id > ? LIMIT 1",
+                (season, int(wm["last_match_id"] if wm["last_match_id"] is not None else -1)),
+            ).fetchone()
+            if newer is None:
+                return RedirectResponse(url=f"/admin/highlights/dry-run?season={season}&unchanged=1", status_code=303)
 
         # Wrestlers (recompute full slice — idempotent)
         results = dry_run_all(conn, season=season)
-        conn.execute("DELETE FROM wrestler_highlights WHERE season = ?", (season,))
-        inserted = 0
-        for wid, labels in results.items():
-            for label in labels:
-                hid = _label_id(conn, label)
-                if hid != -1:
-                    conn.execute(
-                        "INSERT OR IGNORE INTO wrestler_highlights(wrestler_id, highlight_id, season) VALUES (?, ?, ?)",
-                        (int(wid), hid, int(season)),
-                    )
-                    inserted += 1
+        inserted = _rewrite_wrestler_highlights(conn, int(season), results)
         # Teams (Tag Team World — champions)
         t_inserted = recompute_team_tag_highlights(conn, int(season))
         _record_highlight_run(conn, int(season))
@@ -4242,8 +4188,6 @@ def admin_highlights_persist_incremental(season: int = Form(...)):
 
 
 
-from fastapi import Form
-from fastapi.responses import RedirectResponse
 
 
 
@@ -4258,4 +4202,6 @@ def admin_home(request: Request):
 
 
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run("app:app", host="127.0.0.1", port=8000, reload=True)
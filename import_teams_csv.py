@@ -2,13 +2,16 @@ from __future__ import annotations
 
 import argparse
 import csv
+from contextlib import closing
 from pathlib import Path
 import sqlite3
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Set, Tuple
 
 APP_DIR = Path(__file__).resolve().parent
 DB_PATH = APP_DIR / "data" / "wut.db"
 
+SQL_INSERT_MEMBER = "INSERT INTO tag_team_members(team_id, wrestler_id) VALUES (?,?)"
+
 # ---------------- DB helpers ----------------
 
 def connect(db_path: Path) -> sqlite3.Connection:
@@ -67,27 +70,34 @@ def ensure_status_column(conn: sqlite3.Connection) -> None:
 
 # ---------------- Normalizers ----------------
 
+_ACTIVE_MAP = {
+    "yes": 1, "y": 1, "true": 1, "1": 1,
+    "no": 0, "n": 0, "false": 0, "0": 0,
+}
+
+_STATUS_MAP = {
+    "active": "Active", "yes": "Active", "y": "Active", "1": "Active", "true": "Active",
+    "inactive": "Inactive", "no": "Inactive", "n": "Inactive", "0": "Inactive", "false": "Inactive",
+    "disbanded": "Disbanded", "retired": "Disbanded", "split": "Disbanded",
+}
+
+
 def norm_active(val: str) -> int:
-    v = (val or "").strip().lower()
-    if v in {"yes", "y", "true", "1"}: return 1
-    if v in {"no", "n", "false", "0"}: return 0
-    raise ValueError("Active must be Yes/No (or Y/N/True/False/1/0)")
+    try:
+        return _ACTIVE_MAP[(val or "").strip().lower()]
+    except KeyError:
+        raise ValueError("Active must be Yes/No (or Y/N/True/False/1/0)") from None
 
 
 def norm_status(val: str) -> str:
-    v = (val or "").strip().lower()
-    mapping = {
-        "active": "Active", "yes": "Active", "y": "Active", "1": "Active", "true": "Active",
-        "inactive": "Inactive", "no": "Inactive", "n": "Inactive", "0": "Inactive", "false": "Inactive",
-        "disbanded": "Disbanded", "retired": "Disbanded", "split": "Disbanded",
-    }
-    if v in mapping:
-        return mapping[v]
-    raise ValueError("Status must be Active/Inactive/Disbanded (or Yes/No/True/False/Disbanded)")
+    try:
+        return _STATUS_MAP[(val or "").strip().lower()]
+    except KeyError:
+        raise ValueError("Status must be Active/Inactive/Disbanded (or Yes/No/True/False/Disbanded)") from None
 
 # ---------------- CSV helpers ----------------
 
-def sniff(text: str, forced_delim: str | None) -> csv.Dialect:
+def sniff(sample: str, forced_delim: str | None) -> csv.Dialect:
     if forced_delim:
         class D(csv.Dialect):
             delimiter = forced_delim
@@ -98,20 +108,27 @@ def sniff(text: str, forced_delim: str | None) -> csv.Dialect:
             quoting = csv.QUOTE_MINIMAL
         return D
     try:
-        return csv.Sniffer().sniff(text[:4096], delimiters=[",",";","\t","|"])
+        return csv.Sniffer().sniff(sample, delimiters=[",",";","\t","|"])
     except Exception:
         return csv.get_dialect("excel")
 
 
-def parse_members(row: Dict[str, str], member_sep: str) -> List[str]:
-    lower = {k.lower(): (v or "").strip() for k, v in row.items()}
+def _cell(row: List[str], i: Optional[int]) -> str:
+    return row[i].strip() if i is not None and i < len(row) else ""
+
+
+def parse_members(row: List[str], hmap: Dict[str, int], member_sep: str) -> List[str]:
+    """hmap maps lower-cased header -> column index (built once per file)."""
     names: List[str] = []
-    if "members" in lower and lower["members"]:
-        names = [p.strip() for p in lower["members"].split(member_sep) if p.strip()]
+    members = _cell(row, hmap.get("members"))
+    if members:
+        names = [p.strip() for p in members.split(member_sep) if p.strip()]
     else:
-        for k, v in lower.items():
-            if k.startswith("member") and v:
-                names.append(v)
+        for k, i in hmap.items():
+            if k.startswith("member"):
+                v = _cell(row, i)
+                if v:
+                    names.append(v)
     # de-dupe, keep order
     seen, out = set(), []
     for n in names:
@@ -139,30 +156,47 @@ def load_wrestler_index(conn: sqlite3.Connection) -> Dict[str, Tuple[int, str]]:
     return idx
 
 
-def ensure_wrestler(
-    conn: sqlite3.Connection,
-    name: str,
+def queue_new_members(
+    member_names: List[str],
     team_status: str,
     wrestlers_idx: Dict[str, Tuple[int, str]],
-    create: bool = True,
-) -> int:
-    key = name.strip().lower()
-    if key in wrestlers_idx:
-        wid, gender = wrestlers_idx[key]
-        if gender != "Male":
+    new_wrestlers: Dict[str, Tuple[str, int]],
+) -> None:
+    """Check existing members are Male; queue unknown names on new_wrestlers (key -> (name, active)).
+    Every member is checked before anything is queued, so a rejected row creates no wrestlers."""
+    keys = [name.strip().lower() for name in member_names]
+    for name, key in zip(member_names, keys):
+        if key in wrestlers_idx and wrestlers_idx[key][1] != "Male":
             raise ValueError(f"Only male wrestlers allowed in teams (offending: {name})")
-        return wid
-    active_int = 1 if team_status == "Active" else 0
-    if not create:
-        return -1
-    cur = conn.execute(
-        "INSERT INTO wrestlers(name, gender, active) VALUES (?,?,?)",
-        (name.strip(), "Male", active_int),
+    for name, key in zip(member_names, keys):
+        if key not in wrestlers_idx and key not in new_wrestlers:
+            new_wrestlers[key] = (name.strip(), 1 if team_status == "Active" else 0)
+
+
+def create_wrestlers(
+    conn: sqlite3.Connection,
+    new_wrestlers: Dict[str, Tuple[str, int]],
+    wrestlers_idx: Dict[str, Tuple[int, str]],
+) -> None:
+    """Insert all queued members (Male) with one executemany and add their ids to wrestlers_idx."""
+    if not new_wrestlers:
+        return
+    last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM wrestlers").fetchone()[0]
+    conn.executemany(
+        "INSERT INTO wrestlers(name, gender, active) VALUES (?, 'Male', ?)",
+        list(new_wrestlers.values()),
     )
-    wid = cur.lastrowid
-    wrestlers_idx[key] = (wid, "Male")
-    print(f"[create] Added wrestler: {name} (Male, active={active_int})")
-    return wid
+    # AUTOINCREMENT ids only grow, so everything past last_id was just inserted
+    for r in conn.execute("SELECT id, name FROM wrestlers WHERE id > ?", (last_id,)):
+        wrestlers_idx[r["name"].strip().lower()] = (r["id"], "Male")
+    for name, active_int in new_wrestlers.values():
+        print(f"[create] Added wrestler: {name} (Male, active={active_int})")
+
+
+def flush_members(conn: sqlite3.Connection, pending: List[Tuple[int, int]]) -> None:
+    if pending:
+        conn.executemany(SQL_INSERT_MEMBER, pending)
+        pending.clear()
 
 
 def upsert_team(
@@ -171,7 +205,10 @@ def upsert_team(
     status: str,
     member_ids: List[int],
     mode: str,
+    pending: List[Tuple[int, int]],
 ) -> str:
+    """Member rows are queued on `pending` (team_id, wrestler_id); callers flush them with flush_members,
+    and must do so before upserting a team whose rows are still queued."""
     active_int = 1 if status == "Active" else 0
     cur = conn.execute("SELECT id FROM tag_teams WHERE name = ? COLLATE NOCASE", (name,))
     row = cur.fetchone()
@@ -181,11 +218,7 @@ def upsert_team(
             (name, active_int, status),
         )
         team_id = cur.lastrowid
-        if member_ids:
-            conn.executemany(
-                "INSERT INTO tag_team_members(team_id, wrestler_id) VALUES (?,?)",
-                [(team_id, wid) for wid in member_ids],
-            )
+        pending.extend((team_id, wid) for wid in member_ids)
         return "inserted"
 
     team_id = row[0]
@@ -205,11 +238,7 @@ def upsert_team(
             (team_id,),
         )}
         add = [wid for wid in member_ids if wid not in existing]
-    if add:
-        conn.executemany(
-            "INSERT INTO tag_team_members(team_id, wrestler_id) VALUES (?,?)",
-            [(team_id, wid) for wid in add],
-        )
+    pending.extend((team_id, wid) for wid in add)
     return "updated"
 
 # ---------------- Main ----------------
@@ -235,84 +264,119 @@ def main() -> None:
     if not csv_file.exists():
         raise SystemExit(f"CSV not found: {csv_file}")
 
-    text = csv_file.read_text(encoding="utf-8-sig")
-    dialect = sniff(text, args.delimiter)
-
-    # Reader with or without headers
-    reader = csv.DictReader(text.splitlines(), dialect=dialect)
-    positional = False
-    if not reader.fieldnames or not any(h and h.lower() == "name" for h in reader.fieldnames):
-        positional = True
-        reader = csv.reader(text.splitlines(), dialect=dialect)
-
-    wrestlers_idx = load_wrestler_index(conn)
+    with closing(conn), csv_file.open(encoding="utf-8-sig", newline="") as f:
+        dialect = sniff(f.read(4096), args.delimiter)
+        f.seek(0)
 
-    total = inserted = updated = skipped = errors = 0
-    to_commit = 0
+        # Reader with or without headers
+        reader = csv.reader(f, dialect=dialect)
+        header = next(reader, None) or []
+        positional = not any(h and h.lower() == "name" for h in header)
 
-    try:
+        # Pick the per-row field extractor once instead of branching on every row
         if positional:
-            print("[info] No headers found — expecting columns: name, status(or active), members")
-        for i, row in enumerate(reader, start=1):
-            total += 1
-            try:
-                if positional:
+            f.seek(0)
+            reader = csv.reader(f, dialect=dialect)
+            hmap = {"members": 2}
+
+            def get_fields(row: List[str]) -> Tuple[str, str, str]:
+                if len(row) < 3:
+                    raise ValueError("Row must have 3 columns: name, status|active, members")
+                return row[0].strip(), row[1].strip(), ""
+        else:
+            hmap = {h.lower(): i for i, h in enumerate(header) if h}
+            name_i, status_i, active_i = hmap["name"], hmap.get("status"), hmap.get("active")
+            reader = (r for r in reader if r)  # skip blank lines
+
+            def get_fields(row: List[str]) -> Tuple[str, str, str]:
+                return _cell(row, name_i), _cell(row, status_i), _cell(row, active_i)
+
+        wrestlers_idx = load_wrestler_index(conn)
+        pending_members: List[Tuple[int, int]] = []
+        queued_teams: Set[str] = set()  # lower-cased names of teams with rows on pending_members
+
+        total = inserted = updated = skipped = errors = 0
+        written = 0
+
+        try:
+            if positional:
+                print("[info] No headers found — expecting columns: name, status(or active), members")
+
+            # Pass 1: validate rows and collect members that need creating
+            teams: List[Tuple[int, str, str, List[str]]] = []  # (row_no, name, status, member_names)
+            new_wrestlers: Dict[str, Tuple[str, int]] = {}
+            for i, row in enumerate(reader, start=1):
+                total += 1
+                try:
+                    name, status_raw, active_raw = get_fields(row)
+                    if not name:
+                        raise ValueError("Team name is required")
+
+                    # Determine status (preferred) or map from active
+                    if status_raw:
+                        status = norm_status(status_raw)
+                    else:
+                        active_n = norm_active(active_raw)
+                        status = "Active" if active_n else "Inactive"
+
+                    member_names = parse_members(row, hmap, args.member_sep)
+                    if len(member_names) < 2:
+                        raise ValueError("At least two member names are required")
+
+                    # Unknown members are auto-created (Male, active derived from team status)
+                    queue_new_members(member_names, status, wrestlers_idx, new_wrestlers)
+                    teams.append((i, name, status, member_names))
+
+                except Exception as e:
+                    errors += 1
+                    print(f"[row {i}] ERROR: {e}")
+
+            if not args.dry_run:
+                # One transaction per file; each team row runs in a SAVEPOINT so a failure
+                # undoes only that row's partial writes (team row, member delete, ...)
+                conn.execute("BEGIN IMMEDIATE")
+                create_wrestlers(conn, new_wrestlers, wrestlers_idx)
+
+                # Pass 2: write teams
+                for i, name, status, member_names in teams:
+                    # A name repeated in the file may have its rows still queued: write them before
+                    # this row's SAVEPOINT so ROLLBACK TO team_row only ever undoes this row's writes
+                    if name.lower() in queued_teams:
+                        flush_members(conn, pending_members)
+                        queued_teams.clear()
+                    mark = len(pending_members)
+                    conn.execute("SAVEPOINT team_row")
                     try:
-                        name = (row[0] or "").strip()
-                        status_raw = (row[1] or "").strip()
-                        members_raw = (row[2] or "").strip()
-                        row_dict = {"name": name, "status": status_raw, "members": members_raw}
-                    except Exception:
-                        raise ValueError("Row must have 3 columns: name, status|active, members")
-                else:
-                    row_dict = {k: (v or "") for k, v in row.items()}
-
-                name = (row_dict.get("name") or row_dict.get("Name") or "").strip()
-                if not name:
-                    raise ValueError("Team name is required")
-
-                # Determine status (preferred) or map from active
-                if row_dict.get("status") or row_dict.get("Status"):
-                    status = norm_status(row_dict.get("status") or row_dict.get("Status"))
-                else:
-                    active_n = norm_active(row_dict.get("active") or row_dict.get("Active") or "")
-                    status = "Active" if active_n else "Inactive"
-
-                member_names = parse_members(row_dict, args.member_sep)
-                if len(member_names) < 2:
-                    raise ValueError("At least two member names are required")
-
-                # Resolve/auto-create members (Male, active derived from team status)
-                member_ids: List[int] = []
-                for m in member_names:
-                    wid = ensure_wrestler(conn, m, status, wrestlers_idx, create=(not args.dry_run))
-                    member_ids.append(wid)
-
-                if args.dry_run:
-                    continue
-
-                res = upsert_team(conn, name, status, member_ids, args.mode)
-                to_commit += 1
-                if res == "inserted":
-                    inserted += 1
-                elif res == "updated":
-                    updated += 1
-                elif res == "skipped":
-                    skipped += 1
-
-                if to_commit >= 500:
-                    conn.commit()
-                    to_commit = 0
-
-            except Exception as e:
-                errors += 1
-                print(f"[row {i}] ERROR: {e}")
-
-        if not args.dry_run and to_commit:
-            conn.commit()
-
-    finally:
-        conn.close()
+                        member_ids = [wrestlers_idx[m.strip().lower()][0] for m in member_names]
+                        res = upsert_team(conn, name, status, member_ids, args.mode, pending_members)
+                        conn.execute("RELEASE team_row")
+                        queued_teams.add(name.lower())
+                        written += 1
+                        if res == "inserted":
+                            inserted += 1
+                        elif res == "updated":
+                            updated += 1
+                        elif res == "skipped":
+                            skipped += 1
+
+                        if written % 500 == 0:
+                            flush_members(conn, pending_members)
+                            queued_teams.clear()
+                            print(f"[progress] {written} teams written")
+
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO team_row")
+                        conn.execute("RELEASE team_row")
+                        del pending_members[mark:]
+                        errors += 1
+                        print(f"[row {i}] ERROR: {e}")
+
+                flush_members(conn, pending_members)
+                conn.commit()
+
+        except BaseException:
+            conn.rollback()
+            raise
 
     print(f"Rows read: {total}")
     if args.dry_run:
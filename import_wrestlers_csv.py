@@ -3,9 +3,10 @@ from __future__ import annotations
 
 import argparse
 import csv
+from contextlib import closing
 from pathlib import Path
 import sqlite3
-from typing import Tuple
+from typing import List, Optional, Tuple
 
 APP_DIR = Path(__file__).resolve().parent
 DB_PATH = APP_DIR / "data" / "wut.db"
@@ -30,21 +31,24 @@ def init_schema(conn: sqlite3.Connection) -> None:
     )
     conn.commit()
 
+_GENDER_MAP = {"male": "Male", "m": "Male", "female": "Female", "f": "Female"}
+
+_ACTIVE_MAP = {
+    "yes": 1, "y": 1, "true": 1, "1": 1,
+    "no": 0, "n": 0, "false": 0, "0": 0,
+}
+
 def norm_gender(val: str) -> str:
-    v = (val or "").strip().lower()
-    if v in {"male", "m"}:
-        return "Male"
-    if v in {"female", "f"}:
-        return "Female"
-    raise ValueError("Gender must be Male/Female (or M/F)")
+    try:
+        return _GENDER_MAP[(val or "").strip().lower()]
+    except KeyError:
+        raise ValueError("Gender must be Male/Female (or M/F)") from None
 
 def norm_active(val: str) -> int:
-    v = (val or "").strip().lower()
-    if v in {"yes", "y", "true", "1"}:
-        return 1
-    if v in {"no", "n", "false", "0"}:
-        return 0
-    raise ValueError("Active must be Yes/No (or Y/N/True/False/1/0)")
+    try:
+        return _ACTIVE_MAP[(val or "").strip().lower()]
+    except KeyError:
+        raise ValueError("Active must be Yes/No (or Y/N/True/False/1/0)") from None
 
 def upsert(conn: sqlite3.Connection, name: str, gender: str, active: int, update_existing: bool) -> Tuple[str,int]:
     # Case-insensitive match on name
@@ -64,6 +68,9 @@ def upsert(conn: sqlite3.Connection, name: str, gender: str, active: int, update
     )
     return ("inserted", cur.lastrowid)
 
+def _cell(row: List[str], i: Optional[int]) -> str:
+    return row[i].strip() if i is not None and i < len(row) else ""
+
 def sniff_dialect(sample: str, default_delim: str | None) -> csv.Dialect:
     if default_delim:
         class _D(csv.Dialect):
@@ -97,67 +104,79 @@ def main() -> None:
     if not csv_file.exists():
         raise SystemExit(f"CSV not found: {csv_file}")
 
-    text = csv_file.read_text(encoding="utf-8-sig")
-    dialect = sniff_dialect(text[:4096], args.delimiter)
-
-    reader = csv.DictReader(text.splitlines(), dialect=dialect)
-    # If headers are missing, try position-based fallback
-    positional = False
-    if not reader.fieldnames or not any(h.lower() == "name" for h in reader.fieldnames):
-        positional = True
-        reader = csv.reader(text.splitlines(), dialect=dialect)
-
-    total = 0
-    inserted = updated = skipped = errors = 0
-    to_commit = 0
-
-    try:
-        for i, row in enumerate(reader, start=1):
-            total += 1
-            try:
-                if positional:
-                    # Expect columns: name, gender, active
-                    try:
-                        name, gender, active = row[0], row[1], row[2]
-                    except Exception:
-                        raise ValueError("Row must have 3 columns: name, gender, active")
-                else:
-                    name = (row.get("name") or row.get("Name") or "").strip()
-                    gender = (row.get("gender") or row.get("Gender") or "").strip()
-                    active = (row.get("active") or row.get("Active") or "").strip()
-
-                if not name:
-                    raise ValueError("Name is required")
-
-                gender_n = norm_gender(gender)
-                active_n = norm_active(active)
-
-                if args.dry_run:
-                    continue
-
-                status, _rowid = upsert(conn, name, gender_n, active_n, args.update)
-                to_commit += 1
-                if status == "inserted":
-                    inserted += 1
-                elif status == "updated":
-                    updated += 1
-                else:
-                    skipped += 1
-
-                # Commit every 500 rows for speed/atomicity
-                if to_commit >= 500:
-                    conn.commit()
-                    to_commit = 0
-
-            except Exception as e:
-                errors += 1
-                print(f"[row {i}] ERROR: {e}")
-
-        if not args.dry_run and to_commit:
-            conn.commit()
-
-    finally:
-        conn.close()
+    with closing(conn), csv_file.open(encoding="utf-8-sig", newline="") as f:
+        dialect = sniff_dialect(f.read(4096), args.delimiter)
+        f.seek(0)
+
+        reader = csv.reader(f, dialect=dialect)
+        header = next(reader, None) or []
+        # If headers are missing, try position-based fallback
+        positional = not any(h.lower() == "name" for h in header)
+
+        # Pick the per-row field extractor once instead of branching on every row
+        if positional:
+            f.seek(0)
+            reader = csv.reader(f, dialect=dialect)
+
+            # Expect columns: name, gender, active
+            def get_fields(row) -> Tuple[str, str, str]:
+                try:
+                    return row[0], row[1], row[2]
+                except Exception:
+                    raise ValueError("Row must have 3 columns: name, gender, active")
+        else:
+            cols = {h.lower(): i for i, h in enumerate(header)}
+            name_i, gender_i, active_i = cols["name"], cols.get("gender"), cols.get("active")
+            reader = (r for r in reader if r)  # skip blank lines
+
+            def get_fields(row) -> Tuple[str, str, str]:
+                return _cell(row, name_i), _cell(row, gender_i), _cell(row, active_i)
+
+        total = 0
+        inserted = updated = skipped = errors = 0
+        written = 0
+
+        # One transaction per file: a single commit at the end, nothing durable if the run aborts.
+        # Each row is a single write statement, so a failing row leaves nothing behind to roll back.
+        if not args.dry_run:
+            conn.execute("BEGIN IMMEDIATE")
+        try:
+            for i, row in enumerate(reader, start=1):
+                total += 1
+                try:
+                    name, gender, active = get_fields(row)
+
+                    if not name:
+                        raise ValueError("Name is required")
+
+                    gender_n = norm_gender(gender)
+                    active_n = norm_active(active)
+
+                    if args.dry_run:
+                        continue
+
+                    status, _rowid = upsert(conn, name, gender_n, active_n, args.update)
+                    written += 1
+                    if status == "inserted":
+                        inserted += 1
+                    elif status == "updated":
+                        updated += 1
+                    else:
+                        skipped += 1
+
+                    if written % 500 == 0:
+                        print(f"[progress] {written} rows written")
+
+                except Exception as e:
+                    errors += 1
+                    print(f"[row {i}] ERROR: {e}")
+
+            if not args.dry_run:
+                conn.commit()
+
+        except BaseException:
+            conn.rollback()
+            raise
 
     print(f"Rows read: {total}")
     if args.dry_run:
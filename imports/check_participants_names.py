@@ -22,39 +22,51 @@ import csv
 import os
 import sqlite3
 import sys
-from typing import Dict, List, Set
+from pathlib import Path
+from typing import Dict, List, Set, Tuple
 
 DB_PATH = os.path.join("data", "wut.db")
 
 
-def load_db() -> tuple[Dict[str, int], Dict[str, List[int]]]:
-    """Return (wrestlers_by_name_lower -> id, teams_by_name_lower -> [wrestler_ids])."""
+def name_key(name: str | None) -> str:
+    return (name or "").strip().lower()
+
+
+# name_key() is the same Python normalisation main() applies to CSV names, so non-ASCII
+# names fold identically on both sides (SQLite's LOWER() only folds ASCII, TRIM() only spaces)
+RESOLVE_SQL = """
+SELECT p.name_l,
+       p.type,
+       wn.n IS NOT NULL AS is_wrestler,
+       tc.c AS member_count
+FROM p
+LEFT JOIN (SELECT DISTINCT name_key(w.name) AS n FROM wrestlers w) wn ON wn.n = p.name_l
+LEFT JOIN (
+    SELECT name_key(tt.name) AS n, COUNT(*) AS c
+    FROM tag_teams tt
+    JOIN tag_team_members ttm ON ttm.team_id = tt.id
+    GROUP BY name_key(tt.name)
+) tc ON tc.n = p.name_l
+"""
+
+
+def connect_db() -> sqlite3.Connection:
     if not os.path.exists(DB_PATH):
         raise SystemExit(f"DB not found: {DB_PATH}")
-    conn = sqlite3.connect(DB_PATH)
+    # Read-only: no journal/locking setup for writes. (PRAGMA query_only is not used
+    # because it would also block the TEMP table that resolve_names() builds.)
+    conn = sqlite3.connect(f"{Path(DB_PATH).resolve().as_uri()}?mode=ro", uri=True)
     conn.row_factory = sqlite3.Row
-    # Wrestlers
-    wrestlers: Dict[str, int] = {}
-    for r in conn.execute("SELECT id, name FROM wrestlers").fetchall():
-        name = (r["name"] or "").strip()
-        if name:
-            wrestlers[name.lower()] = int(r["id"])
-    # Teams -> members (wrestler ids)
-    teams: Dict[str, List[int]] = {}
-    rows = conn.execute(
-        """
-        SELECT tt.name AS team_name, ttm.wrestler_id
-        FROM tag_teams tt
-        JOIN tag_team_members ttm ON ttm.team_id = tt.id
-        ORDER BY tt.name
-        """
-    ).fetchall()
-    for r in rows:
-        tname = (r["team_name"] or "").strip()
-        if tname:
-            teams.setdefault(tname.lower(), []).append(int(r["wrestler_id"]))
-    conn.close()
-    return wrestlers, teams
+    conn.create_function("name_key", 1, name_key, deterministic=True)
+    return conn
+
+
+def resolve_names(conn: sqlite3.Connection, candidates: List[Tuple[str, str]]):
+    """Join (name_lower, forced_type) candidates against wrestlers/teams in one query.
+    Yields rows of (name_l, type, is_wrestler, member_count); member_count is NULL for non-teams."""
+    conn.execute("CREATE TEMP TABLE p (name_l TEXT NOT NULL, type TEXT NOT NULL, PRIMARY KEY (name_l, type))")
+    conn.executemany("INSERT OR IGNORE INTO p (name_l, type) VALUES (?, ?)", candidates)
+    yield from conn.execute(RESOLVE_SQL)
 
 
 def main() -> int:
@@ -66,10 +78,10 @@ def main() -> int:
         print(f"File not found: {csv_path}")
         return 2
 
-    wrestlers, teams = load_db()
-
-    unknown: Set[str] = set()
-    bad_teams: Dict[str, int] = {}  # name_lower -> member_count
+    # Partition candidates by forced Type (name_lower -> name as written in CSV)
+    wrestler_candidates: Dict[str, str] = {}
+    team_candidates: Dict[str, str] = {}
+    auto_candidates: Dict[str, str] = {}
 
     with open(csv_path, "r", encoding="utf-8", newline="") as f:
         rdr = csv.DictReader(f)
@@ -83,34 +95,41 @@ def main() -> int:
         col_w = headers_low["wrestler"]
         col_t = headers_low.get("type")  # optional
 
+        buckets = {"wrestler": wrestler_candidates, "team": team_candidates}
         for row in rdr:
             name_raw = (row.get(col_w) or "").strip()
             if not name_raw:
                 continue
-            name_l = name_raw.lower()
             forced = (row.get(col_t) or "").strip().lower() if col_t else ""
+            buckets.get(forced, auto_candidates).setdefault(name_key(name_raw), name_raw)
 
-            if forced == "wrestler":
-                if name_l not in wrestlers:
-                    unknown.add(name_raw)
-                continue
-            if forced == "team":
-                members = teams.get(name_l)
-                if not members:
+    raw_names = {**auto_candidates, **team_candidates, **wrestler_candidates}
+    candidates = [(n, "wrestler") for n in wrestler_candidates]
+    candidates += [(n, "team") for n in team_candidates]
+    candidates += [(n, "") for n in auto_candidates]
+
+    unknown: Set[str] = set()
+    bad_teams: Dict[str, int] = {}  # name -> member_count
+
+    conn = connect_db()
+    try:
+        for r in resolve_names(conn, candidates):
+            name_raw = raw_names[r["name_l"]]
+            members = r["member_count"]
+            if r["type"] == "wrestler":
+                if not r["is_wrestler"]:
                     unknown.add(name_raw)
-                elif len(members) != 2:
-                    bad_teams[name_raw] = len(members)
                 continue
-
-            # Auto-detect: try wrestler first, then team
-            if name_l in wrestlers:
+            # Forced team, or auto-detect: wrestler first, then team
+            if r["type"] != "team" and r["is_wrestler"]:
                 continue
-            members = teams.get(name_l)
             if members is None:
                 unknown.add(name_raw)
-            elif len(members) != 2:
-                bad_teams[name_raw] = len(members)
+            elif members != 2:
+                bad_teams[name_raw] = members
             # else: valid 2-person team → OK
+    finally:
+        conn.close()
 
     if not unknown and not bad_teams:
         print("All participant names resolve to either a Wrestler or a 2-person Team. ✅")
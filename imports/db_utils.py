@@ -0,0 +1,49 @@
+# /imports/db_utils.py
+"""
+SQLite helpers shared by the scripts in imports/.
+
+The scripts are run as `python imports/<script>.py`, which puts imports/ on sys.path,
+so they import this module as a sibling: `from db_utils import backup_db`.
+"""
+from __future__ import annotations
+import os, sqlite3
+
+
+def backup_db(src: str, dst: str) -> None:
+    """Consistent copy of src at dst via VACUUM INTO (includes committed WAL content).
+    VACUUM INTO refuses an existing file, so write to a temp name and swap it in;
+    a failed VACUUM INTO leaves neither the temp file nor a partial dst behind."""
+    tmp = dst + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    con = sqlite3.connect(src)
+    try:
+        con.execute("VACUUM INTO ?", (tmp,))
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    finally:
+        con.close()
+    os.replace(tmp, dst)
+
+
+def tune_for_bulk(conn: sqlite3.Connection) -> None:
+    """Settings for one bulk write. synchronous/temp_store/cache_size only last for this
+    connection, but journal_mode=WAL is stored in the database file: once a script calls
+    this, the DB (the app's included) stays in WAL mode until switched back explicitly.
+    Must run outside a transaction, since journal_mode can't change inside one."""
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-65536")
+
+
+# Times-export snapshot built by export_matches_for_times.py --refresh-view
+EXPORT_SNAPSHOT_TABLE = "matches_export_mv"
+
+
+def drop_export_snapshot(conn: sqlite3.Connection) -> None:
+    """Drop the times-export snapshot. Writers call this inside the transaction that changes
+    matches/participants, so a later `--use-view` export can't serve rows from before the write."""
+    conn.execute(f"DROP TABLE IF EXISTS {EXPORT_SNAPSHOT_TABLE}")
@@ -19,6 +19,13 @@ Optional flags:
   --db data/wut.db         # custom DB path (default: data/wut.db)
   --season 4               # only one season
   --season-range 1 4       # inclusive range (min max)
+  --refresh-view           # rebuild the matches_export_mv snapshot table, then export from it
+  --use-view               # export from the existing snapshot instead of re-aggregating participants
+
+Without either flag the export always reads the live tables. --use-view serves the rows as
+of the last --refresh-view: the importers and update_match_times.py drop the snapshot when
+they write (falling back to the live tables), but edits made in the app do not, so refresh
+it before using it after app edits.
 
 You can open the CSV, fill the time_mmss column (e.g., 12:34), save, then run
 imports/update_match_times.py to bulk-update without creating duplicates.
@@ -31,6 +38,42 @@ import os
 import sqlite3
 from typing import Optional
 
+from db_utils import EXPORT_SNAPSHOT_TABLE
+
+# 1 MiB file buffer: far fewer write syscalls than the 8 KiB default on large exports
+IO_BUFFER_SIZE = 1 << 20
+
+# Snapshot of the aggregated export rows, rebuilt on demand with --refresh-view
+MV_TABLE = EXPORT_SNAPSHOT_TABLE
+
+EXPORT_SELECT_SQL = """
+    SELECT m.id AS match_id,
+           m.season,
+           m.tournament,
+           m.round,
+           GROUP_CONCAT(CASE WHEN mp.side = 1 THEN w.name END, ' & ') AS side1,
+           GROUP_CONCAT(CASE WHEN mp.side = 2 THEN w.name END, ' & ') AS side2,
+           m.match_time_seconds AS time_seconds,
+           m.day_index,
+           m.order_in_day
+      FROM matches m
+      LEFT JOIN match_participants mp ON mp.match_id = m.id
+      LEFT JOIN wrestlers w ON w.id = mp.wrestler_id
+"""
+
+
+# Deletes the characters that force csv quoting; a cell is plain if translating leaves it unchanged
+_QUOTE_TABLE = str.maketrans("", "", ',"\n\r')
+
+
+def fast_writerow(fh, writer, cells: list[str]) -> None:
+    """Write one CSV row by joining plain cells directly; rows that need quoting go through csv.writer."""
+    for c in cells:
+        if len(c.translate(_QUOTE_TABLE)) != len(c):
+            writer.writerow(cells)
+            return
+    fh.write(",".join(cells) + "\r\n")  # csv.writer's default line terminator
+
 
 def _fmt_time(seconds: Optional[int]) -> Optional[str]:
     if seconds is None:
@@ -43,61 +86,70 @@ def _fmt_time(seconds: Optional[int]) -> Optional[str]:
     return f"{m}:{s:02d}"
 
 
-def export_csv(db_path: str, out_csv: str, season: Optional[int], season_range: Optional[tuple[int, int]]) -> int:
+def refresh_view(conn: sqlite3.Connection) -> None:
+    """Rebuild the export snapshot from the live tables (stamped with created_at)."""
+    conn.execute(f"DROP TABLE IF EXISTS {MV_TABLE}")
+    conn.execute(
+        f"CREATE TABLE {MV_TABLE} AS SELECT e.*, CURRENT_TIMESTAMP AS created_at "
+        f"FROM ({EXPORT_SELECT_SQL} GROUP BY m.id) e"
+    )
+    conn.execute(f"CREATE INDEX idx_{MV_TABLE}_order ON {MV_TABLE}(season, day_index, order_in_day, match_id)")
+    conn.commit()
+
+
+def export_csv(db_path: str, out_csv: str, season: Optional[int], season_range: Optional[tuple[int, int]],
+               refresh: bool = False, use_view: bool = False) -> int:
     if not os.path.exists(db_path):
         raise SystemExit(f"DB not found: {db_path}")
 
+    # Plain tuples (no sqlite3.Row); the export loop unpacks columns positionally
     conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
     try:
-        sql = [
-            """
-            SELECT m.id AS match_id,
-                   m.season,
-                   m.tournament,
-                   m.round,
-                   (SELECT GROUP_CONCAT(w.name, ' & ')
-                      FROM match_participants mp
-                      JOIN wrestlers w ON w.id = mp.wrestler_id
-                     WHERE mp.match_id = m.id AND mp.side = 1
-                     ORDER BY w.name) AS side1,
-                   (SELECT GROUP_CONCAT(w.name, ' & ')
-                      FROM match_participants mp
-                      JOIN wrestlers w ON w.id = mp.wrestler_id
-                     WHERE mp.match_id = m.id AND mp.side = 2
-                     ORDER BY w.name) AS side2,
-                   m.match_time_seconds AS time_seconds
-              FROM matches m
-            """
-        ]
+        if refresh:
+            refresh_view(conn)
+        # The snapshot is only read on request; a plain export always sees the current times
+        use_mv = (refresh or use_view) and conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (MV_TABLE,)
+        ).fetchone() is not None
+        if use_view and not use_mv:
+            print(f"No {MV_TABLE} snapshot (never built, or dropped by a later write); exporting from the live tables")
+        if use_mv:
+            created_at = conn.execute(f"SELECT MAX(created_at) FROM {MV_TABLE}").fetchone()[0]
+            print(f"Using snapshot {MV_TABLE} (refreshed {created_at or 'n/a'}); --refresh-view rebuilds it")
+            base_sql = f"SELECT match_id, season, tournament, round, side1, side2, time_seconds FROM {MV_TABLE}"
+            season_col = "season"
+            tail_sql = " ORDER BY season, day_index, order_in_day, match_id"
+        else:
+            base_sql = EXPORT_SELECT_SQL
+            season_col = "m.season"
+            tail_sql = " GROUP BY m.id ORDER BY m.season, m.day_index, m.order_in_day, m.id"
         params: list[object] = []
         where = []
         if season is not None:
-            where.append("m.season = ?")
+            where.append(f"{season_col} = ?")
             params.append(season)
         elif season_range is not None:
             lo, hi = season_range
-            where.append("m.season BETWEEN ? AND ?")
+            where.append(f"{season_col} BETWEEN ? AND ?")
             params.extend([lo, hi])
-        if where:
-            sql.append("WHERE ")
-            sql.append(" AND ".join(where))
-        sql.append(" ORDER BY m.season, m.day_index, m.order_in_day, m.id")
-        query = "".join(sql)
+        where_clause = f" WHERE {' AND '.join(where)}" if where else ""
+        query = base_sql + where_clause + tail_sql
 
         cur = conn.execute(query, params)
-        rows = cur.fetchall()
 
-        with open(out_csv, "w", newline="", encoding="utf-8") as f:
+        # Stream rows straight from the cursor into the CSV
+        n = 0
+        with open(out_csv, "w", newline="", encoding="utf-8", buffering=IO_BUFFER_SIZE) as f:
             w = csv.writer(f)
             w.writerow(["match_id", "season", "tournament", "round", "side1", "side2", "time_mmss"])
-            for r in rows:
-                time_str = _fmt_time(r["time_seconds"]) or ""
-                w.writerow([
-                    r["match_id"], r["season"], r["tournament"], r["round"],
-                    r["side1"] or "", r["side2"] or "", time_str,
+            # The live query also carries day_index/order_in_day (for the snapshot); *_ drops them
+            for match_id, season_, tournament, rnd, side1, side2, time_sec, *_ in cur:
+                fast_writerow(f, w, [
+                    str(match_id), str(season_), tournament, rnd,
+                    side1 or "", side2 or "", _fmt_time(time_sec) or "",
                 ])
-        return len(rows)
+                n += 1
+        return n
     finally:
         conn.close()
 
@@ -108,6 +160,8 @@ def main() -> None:
     ap.add_argument("--db", default="data/wut.db", help="SQLite DB path (default: data/wut.db)")
     ap.add_argument("--season", type=int, help="only this season", default=None)
     ap.add_argument("--season-range", nargs=2, type=int, metavar=("MIN", "MAX"), default=None)
+    ap.add_argument("--refresh-view", action="store_true", help=f"rebuild the {MV_TABLE} snapshot before exporting")
+    ap.add_argument("--use-view", action="store_true", help=f"export from the existing {MV_TABLE} snapshot")
     args = ap.parse_args()
 
     sr = None
@@ -117,7 +171,8 @@ def main() -> None:
             lo, hi = hi, lo
         sr = (lo, hi)
 
-    n = export_csv(args.db, args.out_csv, args.season, sr)
+    n = export_csv(args.db, args.out_csv, args.season, sr, refresh=args.refresh_view,
+                   use_view=args.use_view)
     print(f"Exported {n} matches → {args.out_csv}")
 
 
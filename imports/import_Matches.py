@@ -5,8 +5,9 @@ Import v2: two CSVs linked by a human-friendly Key.
 Usage (from project root):
   python imports/import_matches_v2.py data/matches.csv data/participants.csv --dry-run
   python imports/import_matches_v2.py data/matches.csv data/participants.csv
+  python imports/import_matches_v2.py data/matches.csv data/participants.csv --mmap --batch-size 5000
 
-CSV A: matches.csv (headers, case-insensitive)
+CSV A: matches.csv (headers, case-insensitive; "_" or no space also accepted, e.g. Winner_Side)
   Key,Season,Day,Tournament,Round,Stipulation,Result,Winner Side,Match Time
     - Result: win|draw|nc  (win requires Winner Side)
     - Match Time: MM:SS (stored as seconds)
@@ -19,30 +20,61 @@ CSV B: participants.csv (headers)
 Import rules:
   - Validates that Winner Side exists among participants when Result=win
   - Validates that each participant wrestler name resolves to an id
-  - Idempotency: this script does not dedupe previously inserted Keys; running twice will duplicate records
+  - Idempotency: Keys are stored on matches.key (unique); Keys already in the DB are skipped with their participants
+
+Note: a real (non dry-run) import switches the DB to WAL journal mode, which persists
+on the file (see db_utils.tune_for_bulk).
 """
 from __future__ import annotations
 
 import argparse
 import csv
+import io
+import mmap
 import os
+import re
 import sqlite3
+from contextlib import closing
 from dataclasses import dataclass
-from typing import Dict, Tuple, List, Optional
+from typing import Dict, Iterator, Tuple, List, Optional
+
+from db_utils import drop_export_snapshot, tune_for_bulk
 
 DB_PATH = os.path.join("data", "wut.db")
 
+# 1 MiB read buffer for the CSVs (default is 8 KiB)
+IO_BUFFER_SIZE = 1 << 20
+
+
+_INSERT_MATCH_SQL = (
+    "INSERT INTO matches (key, season, tournament, round, winner_side, result, stipulation, match_time_seconds, day_index) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+_INSERT_PART_SQL = "INSERT OR IGNORE INTO match_participants (match_id, side, wrestler_id) VALUES (?, ?, ?)"
+
+# Rows per executemany call; bounds memory on very large CSVs
+DEFAULT_BATCH_SIZE = 5000
+# Parameters per IN (...) lookup; stays well under SQLITE_MAX_VARIABLE_NUMBER
+IN_CHUNK_SIZE = 500
+
 
 def connect_db() -> sqlite3.Connection:
     os.makedirs("data", exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+    # isolation_level=None: transactions are opened explicitly (BEGIN IMMEDIATE in import_all)
+    # cached_statements: keep every statement the importer reuses in sqlite3's LRU (default 128)
+    conn = sqlite3.connect(DB_PATH, isolation_level=None, cached_statements=256)
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA foreign_keys = ON;")
     return conn
 
 
+def has_key_column(conn: sqlite3.Connection) -> bool:
+    return "key" in {r[1] for r in conn.execute("PRAGMA table_info(matches)")}
+
+
 def ensure_schema(conn: sqlite3.Connection) -> None:
     # Keep aligned with app schema; minimal definitions to avoid import errors
+    # No commit here: import_all runs this inside its single write transaction
     conn.execute(
         """
         CREATE TABLE IF NOT EXISTS matches (
@@ -78,7 +110,13 @@ def ensure_schema(conn: sqlite3.Connection) -> None:
         );
         """
     )
-    conn.commit()
+    if not has_key_column(conn):
+        conn.execute("ALTER TABLE matches ADD COLUMN key TEXT NULL")
+    # NULLs are distinct, so matches created outside this importer are unaffected
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_matches_key ON matches(key)")
+    # Serves load_wrestler_map's `name COLLATE NOCASE IN (...)` lookup (wrestlers is owned by the app)
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='wrestlers'").fetchone():
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_wrestlers_name_nocase ON wrestlers(name COLLATE NOCASE)")
 
 
 @dataclass
@@ -96,107 +134,240 @@ class MatchRow:
 
 def parse_season(v: str) -> int:
     v = v.strip()
-    return int(v[1:]) if v.lower().startswith("s") else int(v)
+    return int(v[1:]) if v[:1] in ("s", "S") else int(v)
+
+
+# MM:SS with both parts in 0..59; the pattern does the format and range checks in one match
+_MMSS_RE = re.compile(r"^([0-5]?\d):([0-5]?\d)$")
 
 
 def parse_time_mmss(v: str) -> Optional[int]:
     v = (v or "").strip()
     if not v:
         return None
-    parts = v.split(":")
-    if len(parts) != 2:
-        raise ValueError(f"Time must be MM:SS, got {v!r}")
-    m, s = int(parts[0]), int(parts[1])
-    if not (0 <= m <= 59 and 0 <= s <= 59):
-        raise ValueError(f"Time out of range: {v!r}")
-    return m * 60 + s
-
-
-def read_matches_csv(path: str) -> Dict[str, MatchRow]:
-    with open(path, "r", encoding="utf-8", newline="") as f:
-        reader = csv.DictReader(f)
-        required = {"key", "season", "day", "tournament", "round", "stipulation", "result", "winner side", "match time"}
-        low = [h.lower() for h in reader.fieldnames or []]
-        missing = [h for h in required if h not in low]
-        if missing:
-            raise KeyError(f"Missing columns in matches.csv: {missing}")
+    m = _MMSS_RE.match(v)
+    if not m:
+        raise ValueError(f"Time must be MM:SS (00:00-59:59), got {v!r}")
+    return int(m.group(1)) * 60 + int(m.group(2))
+
+
+def parse_numeric_fields(key: str, season_s: str, day_s: str, ws_s: str, time_s: str) -> Tuple[int, int, Optional[int], Optional[int]]:
+    """(season, day, winner_side, time_seconds) for one matches.csv row, parsed in a single call."""
+    season = parse_season(season_s)
+    day = int(day_s)
+    if day < 1:
+        raise ValueError(f"Day must be >=1 for Key {key}")
+    ws_s = ws_s.strip()
+    return season, day, (int(ws_s) if ws_s else None), parse_time_mmss(time_s)
+
+
+MATCH_COLUMNS = ("key", "season", "day", "tournament", "round", "stipulation", "result", "winner side", "match time")
+PARTICIPANT_COLUMNS = ("key", "side", "wrestler")
+
+# Every accepted (lower-cased) header spelling -> canonical column, e.g. "winner_side"/"winnerside" -> "winner side"
+CANONICAL: Dict[str, str] = {
+    alias: canon
+    for canon in MATCH_COLUMNS + PARTICIPANT_COLUMNS
+    for alias in (canon, canon.replace(" ", "_"), canon.replace(" ", ""))
+}
+
+
+def _header_index(header: List[str], required: Tuple[str, ...], csv_name: str) -> Dict[str, int]:
+    """Map canonical column -> index in one pass over the header; report every missing column at once."""
+    idx: Dict[str, int] = {}
+    for i, h in enumerate(header):
+        canon = CANONICAL.get(h.strip().lower())
+        if canon is not None:
+            idx[canon] = i
+    missing = [c for c in required if c not in idx]
+    if missing:
+        raise KeyError(f"Missing columns in {csv_name}: {missing}")
+    return idx
+
+
+def _mmap_rows(path: str) -> Iterator[List[str]]:
+    """csv.reader-compatible rows from a memory-mapped file.
+
+    Plain lines are found with mm.find(b"\n") and split on b","; from the first line containing
+    a quote or a bare \r onwards, the rest of the file is handed to csv.reader, so quoting rules
+    (quotes mid-field, quoted newlines) and line splitting stay exactly csv.reader's.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            size = len(mm)
+            start = 0
+            while start < size:
+                end = mm.find(b"\n", start)
+                if end == -1:
+                    end = size
+                line = mm[start:end]
+                if line.endswith(b"\r"):
+                    line = line[:-1]
+                if b'"' in line or b"\r" in line:
+                    f.seek(start)
+                    text = io.TextIOWrapper(f, encoding="utf-8", newline="")
+                    try:
+                        yield from csv.reader(text)
+                    finally:
+                        text.detach()  # leave f to the enclosing `with`
+                    return
+                start = end + 1
+                yield [c.decode("utf-8") for c in line.split(b",")] if line else []
+
+
+def _csv_rows(path: str, use_mmap: bool = False) -> Iterator[List[str]]:
+    if use_mmap:
+        yield from _mmap_rows(path)
+        return
+    with open(path, "r", encoding="utf-8", newline="", buffering=IO_BUFFER_SIZE) as f:
+        yield from csv.reader(f)
+
+
+def read_matches_csv(path: str, use_mmap: bool = False) -> Dict[str, MatchRow]:
+    with closing(_csv_rows(path, use_mmap)) as reader:
+        header = next(reader, None) or []
+        idx = _header_index(header, MATCH_COLUMNS, "matches.csv")
+        i_key, i_season, i_day = idx["key"], idx["season"], idx["day"]
+        i_tournament, i_round, i_stip = idx["tournament"], idx["round"], idx["stipulation"]
+        i_result, i_ws, i_time = idx["result"], idx["winner side"], idx["match time"]
+        width = len(header)
         rows: Dict[str, MatchRow] = {}
         for raw in reader:
-            d = {k.lower(): v for k, v in raw.items()}
-            key = d["key"].strip()
+            if not raw:
+                continue  # blank line
+            if len(raw) < width:
+                raw += [""] * (width - len(raw))
+            key = raw[i_key].strip()
             if not key:
                 raise ValueError("Empty Key in matches.csv")
-            season = parse_season(d["season"]) 
-            day = int(d["day"]) 
-            if day < 1:
-                raise ValueError(f"Day must be >=1 for Key {key}")
-            tournament = d["tournament"].strip()
-            round_ = d["round"].strip()
-            stip = d.get("stipulation", "").strip() or None
-            result = d["result"].strip().lower()
+            season, day, winner_side, tsec = parse_numeric_fields(key, raw[i_season], raw[i_day], raw[i_ws], raw[i_time])
+            tournament = raw[i_tournament].strip()
+            round_ = raw[i_round].strip()
+            stip = raw[i_stip].strip() or None
+            result = raw[i_result].strip().lower()
             if result not in ("win", "draw", "nc"):
                 raise ValueError(f"Invalid Result for Key {key}: {result!r}")
-            ws = d.get("winner side", "").strip()
-            winner_side = int(ws) if ws else None
             if result == "win" and not winner_side:
                 raise ValueError(f"Winner Side required when Result=win (Key {key})")
-            tsec = parse_time_mmss(d.get("match time", ""))
             rows[key] = MatchRow(key, season, day, tournament, round_, stip, result, winner_side, tsec)
         return rows
 
 
-def lookup_wrestler_id(conn: sqlite3.Connection, name: str) -> int:
-    r = conn.execute("SELECT id FROM wrestlers WHERE LOWER(name) = LOWER(?)", (name.strip(),)).fetchone()
-    if not r:
+def load_wrestler_map(conn: sqlite3.Connection, names: List[str]) -> Dict[str, int]:
+    """{name_lower: id} for just the given names, fetched IN_CHUNK_SIZE at a time via the NOCASE
+    name index (first id wins on duplicate names)."""
+    wanted = sorted({n.strip() for n in names})
+    wr_map: Dict[str, int] = {}
+    for i in range(0, len(wanted), IN_CHUNK_SIZE):
+        chunk = wanted[i:i + IN_CHUNK_SIZE]
+        rows = conn.execute(
+            f"SELECT id, name FROM wrestlers WHERE name COLLATE NOCASE IN ({','.join('?' * len(chunk))}) ORDER BY id",
+            chunk,
+        )
+        for wid, name in rows:
+            wr_map.setdefault(name.lower(), int(wid))
+    return wr_map
+
+
+def lookup_wrestler_id(wr_map: Dict[str, int], name: str) -> int:
+    wid = wr_map.get(name.strip().lower())
+    if wid is None:
         raise ValueError(f"Unknown wrestler name: {name!r}")
-    return int(r[0])
+    return wid
 
 
-def read_participants_csv(path: str) -> List[Tuple[str, int, str]]:
-    with open(path, "r", encoding="utf-8", newline="") as f:
-        reader = csv.DictReader(f)
-        required = {"key", "side", "wrestler"}
-        low = [h.lower() for h in reader.fieldnames or []]
-        missing = [h for h in required if h not in low]
-        if missing:
-            raise KeyError(f"Missing columns in participants.csv: {missing}")
+def read_participants_csv(path: str, use_mmap: bool = False) -> List[Tuple[str, int, str]]:
+    with closing(_csv_rows(path, use_mmap)) as reader:
+        header = next(reader, None) or []
+        idx = _header_index(header, PARTICIPANT_COLUMNS, "participants.csv")
+        i_key, i_side, i_wrestler = idx["key"], idx["side"], idx["wrestler"]
+        width = len(header)
         out: List[Tuple[str, int, str]] = []
         for raw in reader:
-            d = {k.lower(): v for k, v in raw.items()}
-            key = d["key"].strip()
-            side = int(d["side"]) if d["side"].strip() else 0
+            if not raw:
+                continue  # blank line
+            if len(raw) < width:
+                raw += [""] * (width - len(raw))
+            key = raw[i_key].strip()
+            side_txt = raw[i_side].strip()
+            side = int(side_txt) if side_txt else 0
             if side < 1:
                 raise ValueError(f"Side must be >=1 for Key {key}")
-            wrestler = d["wrestler"].strip()
+            wrestler = raw[i_wrestler].strip()
             if not key or not wrestler:
                 raise ValueError("Key/Wrestler cannot be empty in participants.csv")
             out.append((key, side, wrestler))
         return out
 
 
-def import_all(matches_csv: str, participants_csv: str, dry_run: bool = False) -> Tuple[int, int]:
-    matches = read_matches_csv(matches_csv)
-    parts = read_participants_csv(participants_csv)
+def executemany_batched(conn: sqlite3.Connection, sql: str, rows, batch_size: int) -> int:
+    """executemany in chunks of batch_size rows; returns the number of rows written."""
+    batch: List[tuple] = []
+    total = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            conn.executemany(sql, batch)
+            total += len(batch)
+            batch.clear()
+    if batch:
+        conn.executemany(sql, batch)
+        total += len(batch)
+    return total
+
+
+def existing_keys(conn: sqlite3.Connection, keys: List[str]) -> set:
+    """Keys already present in matches, looked up IN_CHUNK_SIZE at a time."""
+    found = set()
+    for i in range(0, len(keys), IN_CHUNK_SIZE):
+        chunk = keys[i:i + IN_CHUNK_SIZE]
+        rows = conn.execute(
+            f"SELECT key FROM matches WHERE key IN ({','.join('?' * len(chunk))})", chunk
+        ).fetchall()
+        found.update(r[0] for r in rows)
+    return found
+
+
+def import_all(matches_csv: str, participants_csv: str, dry_run: bool = False,
+               batch_size: int = DEFAULT_BATCH_SIZE, use_mmap: bool = False) -> Tuple[int, int]:
+    matches = read_matches_csv(matches_csv, use_mmap)
+    parts = read_participants_csv(participants_csv, use_mmap)
 
     with connect_db() as conn:
-        ensure_schema(conn)
+        if not dry_run:
+            # journal_mode can't change inside a transaction, so pragmas go first
+            tune_for_bulk(conn)
+            # Single write transaction for schema + matches + participants; on error the `with` block issues ROLLBACK
+            conn.execute("BEGIN IMMEDIATE")
+            ensure_schema(conn)
+
+        # Skip Keys imported by an earlier run, along with their participant rows
+        # (a dry run leaves the schema alone, so on a DB without matches.key nothing was imported yet)
+        existing = existing_keys(conn, list(matches.keys())) if has_key_column(conn) else set()
+        if existing:
+            print(f"Skipping {len(existing)} Key(s) already imported")
+            matches = {k: mr for k, mr in matches.items() if k not in existing}
+            parts = [p for p in parts if p[0] not in existing]
 
         # Insert matches first, map Key->id
         key_to_id: Dict[str, int] = {}
         inserted_matches = 0
-        for key, mr in matches.items():
-            if dry_run:
+        if dry_run:
+            for key, mr in matches.items():
                 print(f"DRY-RUN: MATCH {key}: S{mr.season} Day {mr.day} | {mr.tournament} / {mr.round} | {mr.stipulation or '-'} | {mr.result} ws={mr.winner_side} | t={mr.time_seconds}")
-                continue
-            cur = conn.execute(
-                """
-                INSERT INTO matches (season, tournament, round, winner_side, result, stipulation, match_time_seconds, day_index)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                (mr.season, mr.tournament, mr.round, mr.winner_side, mr.result, mr.stipulation, mr.time_seconds, mr.day),
-            )
-            key_to_id[key] = int(cur.lastrowid)
-            inserted_matches += 1
+        else:
+            def rows_gen():
+                for mr in matches.values():
+                    yield (mr.key, mr.season, mr.tournament, mr.round, mr.winner_side, mr.result, mr.stipulation, mr.time_seconds, mr.day)
+
+            # executemany gives no lastrowid per row; ids are ascending in insert order inside our write lock
+            last_id = int(conn.execute("SELECT COALESCE(MAX(id), 0) FROM matches").fetchone()[0])
+            executemany_batched(conn, _INSERT_MATCH_SQL, rows_gen(), batch_size)
+            new_ids = [int(r[0]) for r in conn.execute("SELECT id FROM matches WHERE id > ? ORDER BY id", (last_id,))]
+            key_to_id = dict(zip(matches.keys(), new_ids))
+            inserted_matches = len(new_ids)
 
         # If dry-run, we still need fake IDs to validate participant refs
         if dry_run:
@@ -210,32 +381,33 @@ def import_all(matches_csv: str, participants_csv: str, dry_run: bool = False) -
         # Group participants by key
         from collections import defaultdict
         by_key: Dict[str, Dict[int, List[int]]] = defaultdict(lambda: defaultdict(list))
+        wr_map = load_wrestler_map(conn, [wname for _, _, wname in parts])
         for key, side, wname in parts:
-            wid = lookup_wrestler_id(conn, wname)
+            wid = lookup_wrestler_id(wr_map, wname)
             by_key[key][side].append(wid)
 
-        # Now write participants and validate winner side
-        for key, sides in by_key.items():
-            if key not in key_to_id:
-                raise ValueError(f"participants.csv references unknown Key: {key}")
-            mr = matches[key]
-            if mr.result == 'win' and (mr.winner_side or 0) not in sides:
-                raise ValueError(f"Key {key}: Winner Side {mr.winner_side} has no participants")
-
-            match_id = key_to_id[key]
-            for side, wids in sides.items():
-                for wid in wids:
-                    if dry_run:
-                        print(f"DRY-RUN: PART {key}: match_id=? side={side} wrestler_id={wid}")
-                    else:
-                        conn.execute(
-                            "INSERT OR IGNORE INTO match_participants (match_id, side, wrestler_id) VALUES (?, ?, ?)",
-                            (match_id, side, wid),
-                        )
-                        inserted_parts += 1
+        # Validate winner side per Key while streaming participant rows into executemany batches
+        def part_rows():
+            for key, sides in by_key.items():
+                if key not in key_to_id:
+                    raise ValueError(f"participants.csv references unknown Key: {key}")
+                mr = matches[key]
+                if mr.result == 'win' and (mr.winner_side or 0) not in sides:
+                    raise ValueError(f"Key {key}: Winner Side {mr.winner_side} has no participants")
 
-        if not dry_run:
-            conn.commit()
+                match_id = key_to_id[key]
+                for side, wids in sides.items():
+                    for wid in wids:
+                        yield key, match_id, side, wid
+
+        if dry_run:
+            for key, _, side, wid in part_rows():
+                print(f"DRY-RUN: PART {key}: match_id=? side={side} wrestler_id={wid}")
+        else:
+            rows = ((match_id, side, wid) for _, match_id, side, wid in part_rows())
+            inserted_parts = executemany_batched(conn, _INSERT_PART_SQL, rows, batch_size)
+            drop_export_snapshot(conn)
+            conn.execute("COMMIT")
 
         return inserted_matches, inserted_parts
 
@@ -245,9 +417,14 @@ def main() -> None:
     p.add_argument("matches_csv")
     p.add_argument("participants_csv")
     p.add_argument("--dry-run", action="store_true")
+    p.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help=f"Rows per executemany batch (default {DEFAULT_BATCH_SIZE})")
+    p.add_argument("--mmap", action="store_true", help="Read the CSVs through mmap instead of buffered text I/O")
     args = p.parse_args()
+    if args.batch_size < 1:
+        p.error("--batch-size must be >= 1")
 
-    m, pcount = import_all(args.matches_csv, args.participants_csv, dry_run=args.dry_run)
+    m, pcount = import_all(args.matches_csv, args.participants_csv, dry_run=args.dry_run, batch_size=args.batch_size,
+                           use_mmap=args.mmap)
     if args.dry_run:
         print(f"Checked matches and participants. 0 rows inserted (dry-run).")
     else:
@@ -23,29 +23,49 @@ Validations:
   - Winner Side must exist among participants when Result=win
   - Every Wrestler/Team must resolve (team must have exactly 2 members)
   - Day >= 1; Time format MM:SS if provided
+
+Note: a real (non dry-run) import switches the DB to WAL journal mode, which persists
+on the file (see db_utils.tune_for_bulk).
 """
 from __future__ import annotations
 
 import argparse
 import csv
 import os
+import re
 import sqlite3
 from dataclasses import dataclass
-from typing import Dict, Tuple, List, Optional
+from pathlib import Path
+from typing import Dict, Iterator, Tuple, List, Optional, Set
+
+from db_utils import drop_export_snapshot, tune_for_bulk
 
 DB_PATH = os.path.join("data", "wut.db")
 
+# 1 MiB read buffer for the CSVs (default is 8 KiB)
+IO_BUFFER_SIZE = 1 << 20
+
+SQL_INSERT_PART = "INSERT OR IGNORE INTO match_participants (match_id, side, wrestler_id) VALUES (?, ?, ?)"
 
-def connect_db() -> sqlite3.Connection:
-    os.makedirs("data", exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+
+def connect_db(read_only: bool = False) -> sqlite3.Connection:
+    if read_only:
+        # Dry runs only read the roster: no directory/schema setup, no write locks
+        if not os.path.exists(DB_PATH):
+            raise SystemExit(f"DB not found: {DB_PATH}")
+        conn = sqlite3.connect(f"{Path(DB_PATH).resolve().as_uri()}?mode=ro", uri=True)
+    else:
+        os.makedirs("data", exist_ok=True)
+        # isolation_level=None: no implicit BEGIN/COMMIT; import_all opens its transaction explicitly
+        conn = sqlite3.connect(DB_PATH, isolation_level=None)
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA foreign_keys = ON;")
     return conn
 
 
 def ensure_schema(conn: sqlite3.Connection) -> None:
-    """v2 schema: matches has NO comp1_*/comp2_*; participants carries the sides."""
+    """v2 schema: matches has NO comp1_*/comp2_*; participants carries the sides.
+    Does not commit; import_all runs it inside its write transaction."""
     conn.execute(
         """
         CREATE TABLE IF NOT EXISTS matches (
@@ -75,7 +95,6 @@ def ensure_schema(conn: sqlite3.Connection) -> None:
         );
         """
     )
-    conn.commit()
 
 
 @dataclass
@@ -96,130 +115,180 @@ def parse_season(v: str) -> int:
     return int(v[1:]) if v.lower().startswith("s") else int(v)
 
 
+# MM:SS with both parts in 0..59; the pattern does the format and range checks in one match
+_MMSS_RE = re.compile(r"^([0-5]?\d):([0-5]?\d)$")
+
+
 def parse_time_mmss(v: str) -> Optional[int]:
     v = (v or "").strip()
     if not v:
         return None
-    parts = v.split(":")
-    if len(parts) != 2:
-        raise ValueError(f"Time must be MM:SS, got {v!r}")
-    m, s = int(parts[0]), int(parts[1])
-    if not (0 <= m <= 59 and 0 <= s <= 59):
-        raise ValueError(f"Time out of range: {v!r}")
-    return m * 60 + s
+    m = _MMSS_RE.match(v)
+    if not m:
+        raise ValueError(f"Time must be MM:SS (00:00-59:59), got {v!r}")
+    return int(m.group(1)) * 60 + int(m.group(2))
+
+
+def _header_index(header: List[str], required: Tuple[str, ...], csv_name: str) -> Dict[str, int]:
+    """Map lower-cased header -> column index once per file; raise if a required column is missing."""
+    idx = {h.strip().lower(): i for i, h in enumerate(header)}
+    missing = [h for h in required if h not in idx]
+    if missing:
+        raise KeyError(f"Missing columns in {csv_name}: {missing}")
+    return idx
 
 
 def read_matches_csv(path: str) -> Dict[str, MatchRow]:
-    with open(path, "r", encoding="utf-8", newline="") as f:
-        reader = csv.DictReader(f)
-        required = {"key", "season", "day", "tournament", "round", "stipulation", "result", "winner side", "match time"}
-        low = [h.lower() for h in (reader.fieldnames or [])]
-        missing = [h for h in required if h not in low]
-        if missing:
-            raise KeyError(f"Missing columns in matches.csv: {missing}")
+    with open(path, "r", encoding="utf-8", newline="", buffering=IO_BUFFER_SIZE) as f:
+        reader = csv.reader(f)
+        header = next(reader, None) or []
+        required = ("key", "season", "day", "tournament", "round", "stipulation", "result", "winner side", "match time")
+        idx = _header_index(header, required, "matches.csv")
+        i_key, i_season, i_day = idx["key"], idx["season"], idx["day"]
+        i_tournament, i_round, i_stip = idx["tournament"], idx["round"], idx["stipulation"]
+        i_result, i_ws, i_time = idx["result"], idx["winner side"], idx["match time"]
+        width = len(header)
         rows: Dict[str, MatchRow] = {}
         for raw in reader:
-            d = {k.lower(): (v or "") for k, v in raw.items()}
-            key = d["key"].strip()
+            if not raw:
+                continue  # blank line (DictReader skipped these too)
+            if len(raw) < width:
+                raw += [""] * (width - len(raw))
+            key = raw[i_key].strip()
             if not key:
                 raise ValueError("Empty Key in matches.csv")
-            season = parse_season(d["season"]) 
-            day = int(d["day"]) 
+            season = parse_season(raw[i_season])
+            day = int(raw[i_day])
             if day < 1:
                 raise ValueError(f"Day must be >=1 for Key {key}")
-            tournament = d["tournament"].strip()
-            round_ = d["round"].strip()
-            stip = d.get("stipulation", "").strip() or None
-            result = d["result"].strip().lower()
+            tournament = raw[i_tournament].strip()
+            round_ = raw[i_round].strip()
+            stip = raw[i_stip].strip() or None
+            result = raw[i_result].strip().lower()
             if result not in ("win", "draw", "nc"):
                 raise ValueError(f"Invalid Result for Key {key}: {result!r}")
-            ws = d.get("winner side", "").strip()
+            ws = raw[i_ws].strip()
             winner_side = int(ws) if ws else None
             if result == "win" and not winner_side:
                 raise ValueError(f"Winner Side required when Result=win (Key {key})")
-            tsec = parse_time_mmss(d.get("match time", ""))
+            tsec = parse_time_mmss(raw[i_time])
             if key in rows:
                 raise ValueError(f"Duplicate Key in matches.csv: {key}")
             rows[key] = MatchRow(key, season, day, tournament, round_, stip, result, winner_side, tsec)
         return rows
 
 
-def lookup_wrestler_id(conn: sqlite3.Connection, name: str) -> int:
-    r = conn.execute("SELECT id FROM wrestlers WHERE LOWER(name) = LOWER(?)", (name.strip(),)).fetchone()
-    if not r:
+# Raw CSV name -> stripped lower-case lookup key; cleared by import_all so it lives for one import
+_norm_cache: Dict[str, str] = {}
+
+
+def _norm(n: str) -> str:
+    v = _norm_cache.get(n)
+    if v is None:
+        v = _norm_cache[n] = n.strip().lower()
+    return v
+
+
+def _load_name_maps(conn: sqlite3.Connection) -> Tuple[Dict[str, int], Dict[str, List[int]]]:
+    """Preload roster names once per import: ({wrestler_lower: id}, {team_lower: [member ids]}).
+    On duplicate names the lowest id wins; teams with no members map to []."""
+    wrestlers_by_lower: Dict[str, int] = {}
+    for wid, name in conn.execute("SELECT id, name FROM wrestlers ORDER BY id"):
+        wrestlers_by_lower.setdefault((name or "").lower(), int(wid))
+
+    teams_by_lower: Dict[str, List[int]] = {}
+    team_id_by_lower: Dict[str, int] = {}
+    rows = conn.execute(
+        """
+        SELECT t.id, t.name, m.wrestler_id
+          FROM tag_teams t
+          LEFT JOIN tag_team_members m ON m.team_id = t.id
+         ORDER BY t.id, m.wrestler_id
+        """
+    )
+    for tid, name, wid in rows:
+        nm = (name or "").lower()
+        if team_id_by_lower.setdefault(nm, tid) != tid:
+            continue  # later team with the same name
+        ids = teams_by_lower.setdefault(nm, [])
+        if wid is not None:
+            ids.append(int(wid))
+    return wrestlers_by_lower, teams_by_lower
+
+
+# Specialized resolvers over the _load_name_maps dicts; nm is the _norm()'d name, name the CSV text for errors.
+# Returned lists are shared with the maps and must not be mutated.
+NameMaps = Tuple[Dict[str, int], Dict[str, List[int]]]
+
+
+def _team_members(teams_by_lower: Dict[str, List[int]], nm: str, name: str) -> Optional[List[int]]:
+    ids = teams_by_lower.get(nm)
+    if ids is not None and len(ids) != 2:
+        raise ValueError(f"Team {name!r} does not have exactly 2 members ({len(ids)})")
+    return ids
+
+
+def _resolve_wrestler_only(maps: NameMaps, nm: str, name: str) -> List[int]:
+    wid = maps[0].get(nm)
+    if wid is None:
         raise ValueError(f"Unknown wrestler name: {name!r}")
-    return int(r[0])
+    return [wid]
+
+
+def _resolve_team_only(maps: NameMaps, nm: str, name: str) -> List[int]:
+    ids = _team_members(maps[1], nm, name)
+    if ids is None:
+        raise ValueError(f"Unknown team name: {name!r}")
+    return ids
+
+
+def _resolve_auto(maps: NameMaps, nm: str, name: str) -> List[int]:
+    # Wrestler first, then team
+    wid = maps[0].get(nm)
+    if wid is not None:
+        return [wid]
+    ids = _team_members(maps[1], nm, name)
+    if ids is None:
+        raise ValueError(f"Unknown participant name (not a wrestler or team): {name!r}")
+    return ids
+
 
+# Type column (lower-cased) -> resolver; any other value auto-detects
+_RESOLVERS = {"wrestler": _resolve_wrestler_only, "team": _resolve_team_only}
 
-def resolve_name_to_ids(conn: sqlite3.Connection, name: str, forced_type: Optional[str] = None) -> List[int]:
-    """Return a list of wrestler IDs for this participant name.
+
+def resolve_name_to_ids(maps: NameMaps, name: str, forced_type: Optional[str] = None) -> List[int]:
+    """Return a list of wrestler IDs for this participant name (maps from _load_name_maps).
     - If it's a wrestler name → [id]
     - If it's a 2‑person team name → [id1, id2]
     - If forced_type is provided ("wrestler"|"team" - case-insensitive), only resolve that type.
     Raises ValueError if it cannot resolve.
     """
-    nm = (name or "").strip()
+    nm = _norm(name or "")
     if not nm:
         raise ValueError("Empty participant name")
-    forced = (forced_type or "").strip().lower()
-
-    def find_wrestler(n: str) -> Optional[int]:
-        r = conn.execute("SELECT id FROM wrestlers WHERE LOWER(name) = LOWER(?)", (n.strip(),)).fetchone()
-        return int(r[0]) if r else None
-
-    def find_team_members(n: str) -> Optional[List[int]]:
-        t = conn.execute("SELECT id FROM tag_teams WHERE LOWER(name) = LOWER(?)", (n.strip(),)).fetchone()
-        if not t:
-            return None
-        tid = int(t[0])
-        rows = conn.execute("SELECT wrestler_id FROM tag_team_members WHERE team_id = ?", (tid,)).fetchall()
-        ids = [int(r[0]) for r in rows]
-        if len(ids) != 2:
-            raise ValueError(f"Team {name!r} does not have exactly 2 members ({len(ids)})")
-        return ids
-
-    if forced == "wrestler":
-        wid = find_wrestler(nm)
-        if wid is None:
-            raise ValueError(f"Unknown wrestler name: {name!r}")
-        return [wid]
-    if forced == "team":
-        ids = find_team_members(nm)
-        if ids is None:
-            raise ValueError(f"Unknown team name: {name!r}")
-        return ids
-
-    # Auto-detect: wrestler first, then team
-    wid = find_wrestler(nm)
-    if wid is not None:
-        return [wid]
-    ids = find_team_members(nm)
-    if ids is not None:
-        return ids
-
-    raise ValueError(f"Unknown participant name (not a wrestler or team): {name!r}")
-
-
-def read_participants_csv(path: str) -> List[Tuple[str, int, str, Optional[str]]]:
-    with open(path, "r", encoding="utf-8", newline="") as f:
-        reader = csv.DictReader(f)
-        required = {"key", "side", "wrestler"}
-        low = [h.lower() for h in (reader.fieldnames or [])]
-        missing = [h for h in required if h not in low]
-        if missing:
-            raise KeyError(f"Missing columns in participants.csv: {missing}")
-        out: List[Tuple[str, int, str, Optional[str]]] = []
-        # map canonical header names
-        header_map = {h.lower(): h for h in reader.fieldnames or []}
-        col_key = header_map["key"]
-        col_side = header_map["side"]
-        col_wrestler = header_map["wrestler"]
-        col_type = header_map.get("type")  # optional
+    resolver = _RESOLVERS.get((forced_type or "").strip().lower(), _resolve_auto)
+    return resolver(maps, nm, name)
+
+
+def iter_participants(path: str) -> Iterator[Tuple[str, int, str, Optional[str]]]:
+    """Stream (key, side, name, forced_type) rows from participants.csv."""
+    with open(path, "r", encoding="utf-8", newline="", buffering=IO_BUFFER_SIZE) as f:
+        reader = csv.reader(f)
+        header = next(reader, None) or []
+        idx = _header_index(header, ("key", "side", "wrestler"), "participants.csv")
+        i_key, i_side, i_wrestler = idx["key"], idx["side"], idx["wrestler"]
+        i_type = idx.get("type")  # optional
+        width = len(header)
         for raw in reader:
-            key = (raw.get(col_key) or "").strip()
-            side_txt = (raw.get(col_side) or "").strip()
-            name = (raw.get(col_wrestler) or "").strip()
-            forced = (raw.get(col_type) or "").strip() if col_type else None
+            if not raw:
+                continue  # blank line
+            if len(raw) < width:
+                raw += [""] * (width - len(raw))
+            key = raw[i_key].strip()
+            side_txt = raw[i_side].strip()
+            name = raw[i_wrestler].strip()
+            forced = raw[i_type].strip() if i_type is not None else None
             if not key or not name:
                 raise ValueError("Key/Wrestler cannot be empty in participants.csv")
             if not side_txt:
@@ -230,33 +299,41 @@ def read_participants_csv(path: str) -> List[Tuple[str, int, str, Optional[str]]
                 raise ValueError(f"Side must be an integer for Key {key}, got {side_txt!r}")
             if side < 1:
                 raise ValueError(f"Side must be >=1 for Key {key}")
-            out.append((key, side, name, forced))
-        return out
+            yield key, side, name, forced
 
 
 def import_all(matches_csv: str, participants_csv: str, dry_run: bool = False) -> Tuple[int, int]:
+    _norm_cache.clear()
     matches = read_matches_csv(matches_csv)
-    parts = read_participants_csv(participants_csv)
-
-    with connect_db() as conn:
-        ensure_schema(conn)
 
-        # Group participants by Key -> Side -> [wrestler_id], expanding 2‑person teams
-        from collections import defaultdict
-        by_key_ids: Dict[str, Dict[int, List[int]]] = defaultdict(lambda: defaultdict(list))
-        for key, side, wname, forced_type in parts:
+    with connect_db(read_only=dry_run) as conn:
+        # Phase 1 (reads only): resolve participants into memory.
+        # Group by (Key, Side) -> [wrestler_id], expanding 2‑person teams (team size is checked
+        # by the resolver); sides_by_key records each Key's sides as they first appear
+        by_key_side: Dict[Tuple[str, int], List[int]] = {}
+        sides_by_key: Dict[str, Set[int]] = {}
+        side_of: Dict[Tuple[str, int], int] = {}  # (Key, wrestler_id) -> side
+        maps = _load_name_maps(conn)
+        # Single pass over participants.csv: rows are resolved as they are read, never listed
+        for key, side, wname, forced_type in iter_participants(participants_csv):
             if key not in matches:
                 raise ValueError(f"participants.csv references unknown Key: {key}")
-            wids = resolve_name_to_ids(conn, wname, forced_type)
+            wids = resolve_name_to_ids(maps, wname, forced_type)
+            ids = by_key_side.get((key, side))
+            if ids is None:
+                ids = by_key_side[(key, side)] = []
+                sides_by_key.setdefault(key, set()).add(side)
+            ids.extend(wids)
             for wid in wids:
-                by_key_ids[key][side].append(wid)
+                if side_of.setdefault((key, wid), side) != side:
+                    raise ValueError(
+                        f"Key {key}: {wname!r} puts wrestler id {wid} on sides {side_of[(key, wid)]} and {side}"
+                    )
 
-        # Validate winner side consistency
+        # Phase 2: validate winner side consistency against each Key's set of sides
         for key, mr in matches.items():
-            if mr.result == "win":
-                sides = by_key_ids.get(key, {})
-                if (mr.winner_side or 0) not in sides:
-                    raise ValueError(f"Key {key}: Winner Side {mr.winner_side} has no participants")
+            if mr.result == "win" and (mr.winner_side or 0) not in sides_by_key.get(key, ()):
+                raise ValueError(f"Key {key}: Winner Side {mr.winner_side} has no participants")
 
         if dry_run:
             # Summary like previous output
@@ -266,39 +343,55 @@ def import_all(matches_csv: str, participants_csv: str, dry_run: bool = False) -
                     f"{mr.stipulation or '—'} | {mr.result} ws={mr.winner_side} | t={mr.time_seconds}"
                 )
             # Also show participants briefly
-            for key, sides in by_key_ids.items():
-                for side, wids in sorted(sides.items()):
-                    print(f"DRY-RUN: PART {key}: side={side} count={len(wids)}")
+            for key, sides in sides_by_key.items():
+                for side in sorted(sides):
+                    print(f"DRY-RUN: PART {key}: side={side} count={len(by_key_side[(key, side)])}")
             return 0, 0
 
-        # Insert matches
-        key_to_id: Dict[str, int] = {}
-        inserted_matches = 0
-        for key, mr in matches.items():
-            cur = conn.execute(
+        # Phase 3: input is fully validated; only now touch the schema and write.
+        # Pragmas first (journal_mode can't change inside a transaction), then one explicit
+        # transaction around schema + matches + participants.
+        tune_for_bulk(conn)
+        # Write lock up front: new match ids must be exactly those above the current MAX(id)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            ensure_schema(conn)
+
+            # Insert matches with one executemany; executemany has no per-row lastrowid, so Key->id
+            # comes from the new ids, which are assigned in insert order
+            last_id = int(conn.execute("SELECT COALESCE(MAX(id), 0) FROM matches").fetchone()[0])
+            match_params = [
+                (mr.season, mr.tournament, mr.round, mr.winner_side, mr.result, mr.stipulation, mr.time_seconds, mr.day)
+                for mr in matches.values()
+            ]
+            conn.executemany(
                 """
                 INSERT INTO matches (
                     season, tournament, round, winner_side, result, stipulation, match_time_seconds, day_index
                 ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
                 """,
-                (mr.season, mr.tournament, mr.round, mr.winner_side, mr.result, mr.stipulation, mr.time_seconds, mr.day),
+                match_params,
             )
-            key_to_id[key] = int(cur.lastrowid)
-            inserted_matches += 1
-
-        # Insert participants
-        inserted_parts = 0
-        for key, sides in by_key_ids.items():
-            match_id = key_to_id[key]
-            for side, wids in sides.items():
-                for wid in wids:
-                    conn.execute(
-                        "INSERT OR IGNORE INTO match_participants (match_id, side, wrestler_id) VALUES (?, ?, ?)",
-                        (match_id, side, wid),
-                    )
-                    inserted_parts += 1
-
-        conn.commit()
+            new_ids = [int(r[0]) for r in conn.execute("SELECT id FROM matches WHERE id > ? ORDER BY id", (last_id,))]
+            key_to_id: Dict[str, int] = dict(zip(matches.keys(), new_ids))
+            inserted_matches = len(new_ids)
+
+            # Insert participants
+            part_params = [
+                (key_to_id[key], side, wid)
+                for (key, side), wids in by_key_side.items()
+                for wid in wids
+            ]
+            conn.executemany(SQL_INSERT_PART, part_params)
+            inserted_parts = len(part_params)
+            drop_export_snapshot(conn)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        # Refresh planner statistics after the bulk insert
+        conn.execute("ANALYZE")
+        conn.execute("PRAGMA optimize")
         return inserted_matches, inserted_parts
 
 
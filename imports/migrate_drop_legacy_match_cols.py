@@ -10,10 +10,12 @@ Usage (from project root):
 Safety:
 - Makes a backup `data/wut.db.bak` first.
 - Uses a transaction; on error, nothing is changed.
-- Keeps all existing rows and IDs.
+- Keeps all existing rows and IDs, plus the import Key column (matches.key) and its unique index.
 """
 from __future__ import annotations
-import os, shutil, sqlite3
+import os, sqlite3
+
+from db_utils import backup_db, drop_export_snapshot
 
 DB = os.path.join("data", "wut.db")
 
@@ -28,13 +30,15 @@ CREATE TABLE matches_new (
     stipulation TEXT NULL,
     match_time_seconds INTEGER NULL,
     day_index INTEGER NULL,
-    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    key TEXT NULL
 );
 """
 
+# {key} is `key` when the old table has the import Key column (imports/import_Matches.py), else NULL
 COPY_SQL = """
 INSERT INTO matches_new (
-    id, season, tournament, round, winner_side, result, stipulation, match_time_seconds, day_index, created_at
+    id, season, tournament, round, winner_side, result, stipulation, match_time_seconds, day_index, created_at, key
 )
 SELECT id, season, tournament, round, 
        winner_side,
@@ -42,7 +46,8 @@ SELECT id, season, tournament, round,
        stipulation,
        match_time_seconds,
        day_index,
-       created_at
+       created_at,
+       {key}
 FROM matches;
 """
 
@@ -50,6 +55,7 @@ INDEXES_SQL = [
     "CREATE INDEX IF NOT EXISTS idx_matches_season    ON matches(season);",
     "CREATE INDEX IF NOT EXISTS idx_matches_tournament ON matches(tournament);",
     "CREATE INDEX IF NOT EXISTS idx_matches_day       ON matches(day_index);",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_matches_key ON matches(key);",
 ]
 
 
@@ -59,7 +65,7 @@ def main() -> None:
 
     # Backup
     bak = DB + ".bak"
-    shutil.copy2(DB, bak)
+    backup_db(DB, bak)
     print(f"Backup created: {bak}")
 
     con = sqlite3.connect(DB)
@@ -73,13 +79,17 @@ def main() -> None:
 
         # Build new table, copy, swap
         con.execute(NEW_SCHEMA_SQL)
-        con.execute(COPY_SQL)
+        old_cols = {r[1] for r in con.execute("PRAGMA table_info(matches)")}
+        con.execute(COPY_SQL.format(key="key" if "key" in old_cols else "NULL"))
         con.execute("ALTER TABLE matches RENAME TO matches_old;")
         con.execute("ALTER TABLE matches_new RENAME TO matches;")
+        # The rename keeps idx_matches_key on matches_old; free the name for the new table
+        con.execute("DROP INDEX IF EXISTS idx_matches_key;")
 
         # Recreate indexes
         for sql in INDEXES_SQL:
             con.execute(sql)
+        drop_export_snapshot(con)
 
         # Verify row count
         old_count = con.execute("SELECT COUNT(*) FROM matches_old").fetchone()[0]
@@ -95,6 +105,9 @@ def main() -> None:
     except Exception:
         con.execute("ROLLBACK;")
         raise
+    else:
+        con.execute("ANALYZE;")
+        con.execute("PRAGMA optimize;")
     finally:
         con.execute("PRAGMA foreign_keys=ON;")
         con.close()
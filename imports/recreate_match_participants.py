@@ -7,7 +7,9 @@ Usage:
   python imports/recreate_match_participants.py
 """
 from __future__ import annotations
-import os, shutil, sqlite3
+import os, sqlite3
+
+from db_utils import backup_db, drop_export_snapshot
 
 DB = os.path.join("data", "wut.db")
 
@@ -23,8 +25,9 @@ CREATE TABLE match_participants (
 );
 """
 
+# No separate (match_id) or (match_id, side) index: the UNIQUE(match_id, side, wrestler_id)
+# autoindex already serves both prefixes and covers `SELECT side, wrestler_id ... WHERE match_id = ?`
 INDEXES = [
-    "CREATE INDEX IF NOT EXISTS idx_mp_match ON match_participants(match_id);",
     "CREATE INDEX IF NOT EXISTS idx_mp_wrestler ON match_participants(wrestler_id);",
 ]
 
@@ -32,7 +35,7 @@ def main() -> None:
     if not os.path.exists(DB):
         raise SystemExit(f"DB not found: {DB}")
     bak = DB + ".mp.bak"
-    shutil.copy2(DB, bak)
+    backup_db(DB, bak)
     print(f"Backup created: {bak}")
 
     con = sqlite3.connect(DB)
@@ -43,11 +46,15 @@ def main() -> None:
         con.execute(SQL_CREATE)
         for s in INDEXES:
             con.execute(s)
+        drop_export_snapshot(con)
         con.execute("COMMIT;")
         print("match_participants recreated.")
     except Exception as e:
         con.execute("ROLLBACK;")
         raise
+    else:
+        con.execute("ANALYZE;")
+        con.execute("PRAGMA optimize;")
     finally:
         con.execute("PRAGMA foreign_keys=ON;")
         con.close()
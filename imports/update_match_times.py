@@ -20,32 +20,42 @@ Usage (from project root):
 Options:
   --db data/wut.db   # custom DB path (default: data/wut.db)
   --dry-run          # show what would change without writing
+
+Note: a real (non dry-run) update switches the DB to WAL journal mode, which persists
+on the file (see db_utils.tune_for_bulk).
 """
 from __future__ import annotations
 import argparse
 import csv
 import os
+import re
 import sqlite3
+from functools import lru_cache
 from typing import Optional
 
+from db_utils import drop_export_snapshot, tune_for_bulk
+
+# 1 MiB read buffer for the input CSV (default is 8 KiB)
+IO_BUFFER_SIZE = 1 << 20
+
+
+# MM:SS, whitespace tolerated around the value and the colon; range checks stay in _parse_mmss
+_MMSS = re.compile(r"^\s*(\d+)\s*:\s*(\d+)\s*$")
 
+
+# Only 3600 valid MM:SS values exist, so a large CSV repeats strings heavily; each distinct
+# string is parsed once
+@lru_cache(maxsize=8192)
 def _parse_mmss(value: Optional[str]) -> Optional[int]:
     if not value:
         return None
-    s = value.strip()
-    if not s:
-        return None
-    parts = s.split(":")
-    if len(parts) != 2:
-        return None
-    m_str, s_str = parts[0].strip(), parts[1].strip()
-    if not (m_str.isdigit() and s_str.isdigit()):
+    m = _MMSS.match(value)
+    if not m:
         return None
-    m = int(m_str)
-    sec = int(s_str)
-    if sec >= 60 or m < 0:
+    sec = int(m[2])
+    if sec >= 60:
         return None
-    total = m * 60 + sec
+    total = int(m[1]) * 60 + sec
     return total if total < 3600 else None
 
 
@@ -58,11 +68,15 @@ def bulk_update(db_path: str, csv_path: str, dry_run: bool) -> tuple[int, int, i
     conn = sqlite3.connect(db_path)
     conn.row_factory = sqlite3.Row
     try:
-        updated = 0
+        if not dry_run:
+            tune_for_bulk(conn)
+            # One write transaction for the whole file; closing without commit rolls it back
+            conn.execute("BEGIN IMMEDIATE")
         skipped = 0
-        missing = 0
+        # match_id -> seconds; a repeated match_id keeps its last time, as the old row-by-row updates did
+        secs_by_id: dict[int, Optional[int]] = {}
 
-        with open(csv_path, newline="", encoding="utf-8") as f:
+        with open(csv_path, newline="", encoding="utf-8", buffering=IO_BUFFER_SIZE) as f:
             r = csv.DictReader(f)
             need_cols = {"match_id", "time_mmss"}
             have_cols = {c.strip().lower() for c in r.fieldnames or []}
@@ -78,27 +92,28 @@ def bulk_update(db_path: str, csv_path: str, dry_run: bool) -> tuple[int, int, i
                 if mid is None:
                     skipped += 1
                     continue
-
-                # parse time
-                sec = _parse_mmss(row.get("time_mmss"))
-
-                # confirm match exists
-                exists = conn.execute("SELECT 1 FROM matches WHERE id = ?", (mid,)).fetchone()
-                if not exists:
-                    missing += 1
-                    continue
-
-                if dry_run:
-                    print(f"DRY-RUN: UPDATE matches SET match_time_seconds={sec} WHERE id={mid}")
-                else:
-                    conn.execute(
-                        "UPDATE matches SET match_time_seconds = ? WHERE id = ?",
-                        (sec, mid),
-                    )
-                    updated += 1
-
-        if not dry_run:
+                secs_by_id[mid] = _parse_mmss(row.get("time_mmss"))
+
+        # Load the parsed rows once, then update from the temp table; ids not in matches simply don't match,
+        # so missing = distinct ids - rows the UPDATE touched (no separate existence query)
+        conn.execute("CREATE TEMP TABLE _upd (match_id INTEGER PRIMARY KEY, secs INTEGER)")
+        conn.executemany("INSERT INTO _upd (match_id, secs) VALUES (?, ?)", secs_by_id.items())
+
+        if dry_run:
+            updated = 0
+            found = 0
+            for mid, sec in conn.execute("SELECT u.match_id, u.secs FROM _upd u JOIN matches m ON m.id = u.match_id ORDER BY u.match_id"):
+                print(f"DRY-RUN: UPDATE matches SET match_time_seconds={sec} WHERE id={mid}")
+                found += 1
+        else:
+            # Correlated form rather than UPDATE ... FROM, which needs SQLite 3.33+
+            updated = found = conn.execute(
+                "UPDATE matches SET match_time_seconds = (SELECT secs FROM _upd WHERE match_id = matches.id) "
+                "WHERE id IN (SELECT match_id FROM _upd)"
+            ).rowcount
+            drop_export_snapshot(conn)
             conn.commit()
+        missing = len(secs_by_id) - found
         return updated, skipped, missing
     finally:
         conn.close()
@@ -0,0 +1,44 @@
+"""Parity check: the --mmap CSV reader in imports/import_Matches.py must yield exactly csv.reader's rows.
+
+Run from the project root: python -m unittest discover tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+# The import scripts import their siblings (db_utils) as top-level modules
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "imports"))
+
+from import_Matches import _csv_rows  # noqa: E402
+
+
+CASES = {
+    "plain": "a,b\n1,2\n3,4\n",
+    "crlf": "a,b\r\n1,2\r\n\r\n3,4\r\n",
+    "no_trailing_newline": "a,b\n1,2",
+    "blank_lines": "a,b\n\n1,2\n\n",
+    "quoted_comma": 'a,b\n"x,y",2\n3,4\n',
+    "quoted_newline": 'a,b\n"x\ny",2\n3,4\n',
+    "unbalanced_quote_mid_field": 'a,b\n5" tall,2\n3,4\n5,"6"\n7,8\n',
+    "quote_mid_field_then_comma": 'a,b\nx"y,2\n3,4\n',
+    "bare_cr": "a,b\n1,2\r3,4\n5,6\n",
+    "trailing_cr_at_eof": "a,b\n1,2\r",
+    "utf8": "Key,Wrestler\nk1,Ángel Garza\nk2,Rey Mysterio\n",
+    "empty": "",
+}
+
+
+class MmapReaderParityTest(unittest.TestCase):
+    def test_mmap_rows_match_csv_reader(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for name, content in CASES.items():
+                with self.subTest(name=name):
+                    path = os.path.join(tmp, f"{name}.csv")
+                    with open(path, "wb") as f:
+                        f.write(content.encode("utf-8"))
+                    self.assertEqual(list(_csv_rows(path, True)), list(_csv_rows(path, False)))
+
+
+if __name__ == "__main__":
+    unittest.main()